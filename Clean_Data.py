@@ -1,80 +1,385 @@
+import argparse
+import codecs
+import hashlib
+import io
+import itertools
+import json
+import os
 import re
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+import metrics
 
-def detect_encoding(path: Path):
+
+def detect_encoding(path: Path, prefix_size: int = 64 << 10):
+    """Guess utf-8 or gbk from the first `prefix_size` bytes only.
+
+    A decode error further into the file is handled while reading it, see
+    _LineDecoder.
+    """
+    with path.open("rb") as f:
+        prefix = f.read(prefix_size)
     try:
-        with path.open("r", encoding="utf-8") as f:
-            f.read()
+        # final=False tolerates a multi-byte character cut off at the end
+        codecs.getincrementaldecoder("utf-8")().decode(prefix, final=False)
         return "utf-8"
     except UnicodeDecodeError:
         return "gbk"
 
 
-def remove_parentheses_and_contents(s: str) -> str:
-    # Iteratively remove innermost bracketed segments for many bracket types.
-    patterns = [
-        r"\([^()]*\)",
-        r"（[^（）]*）",
-        r"\[[^\[\]]*\]",
-        r"\{[^{}]*\}",
-        r"<[^<>]*>",
-        r"【[^】]*】",
-        r"《[^》]*》",
-        r"〖[^〗]*〗",
-        r"〔[^〕]*〕",
-    ]
+class _LineDecoder:
+    """Decode blocks of whole lines with the sniffed encoding.
+
+    If a utf-8 block fails to decode, it is decoded line by line and the
+    first line that is not valid utf-8 switches the decoder to gbk for the
+    rest of the stream, so the file is still read only once.
+    """
+
+    def __init__(self, enc: str):
+        self.enc = enc
+
+    def lines(self, block: bytes):
+        if self.enc == "utf-8":
+            try:
+                return io.StringIO(block.decode("utf-8"))
+            except UnicodeDecodeError:
+                return [self._decode_line(raw) for raw in io.BytesIO(block)]
+        return io.StringIO(block.decode(self.enc, errors="ignore"))
+
+    def _decode_line(self, raw: bytes) -> str:
+        if self.enc == "utf-8":
+            try:
+                return raw.decode("utf-8")
+            except UnicodeDecodeError:
+                self.enc = "gbk"
+        return raw.decode(self.enc, errors="ignore")
+
+
+def _iter_lines(f, decoder: _LineDecoder, end: int = None, hasher=None, block_size: int = 1 << 20):
+    """Yield decoded lines from binary file `f`, from its position up to byte `end`.
+
+    Every byte read is also fed to `hasher` when one is given.
+    """
+    while end is None or f.tell() < end:
+        size = block_size if end is None else min(block_size, end - f.tell())
+        block = f.read(size)
+        if not block:
+            break
+        if not block.endswith(b"\n") and (end is None or f.tell() < end):
+            block += f.readline()  # complete the last line of the block
+        if hasher is not None:
+            hasher.update(block)
+        yield from decoder.lines(block)
+
+
+# Bracket pairs removed together with their contents.
+_OPEN_TO_CLOSE = {
+    "(": ")", "（": "）", "[": "]", "{": "}", "<": ">",
+    "【": "】", "《": "》", "〖": "〗", "〔": "〕",
+}
+_CLOSE_TO_OPEN = {v: k for k, v in _OPEN_TO_CLOSE.items()}
+# For these pairs the old regexes only excluded the closing character
+# (e.g. 【[^】]*】), so nesting one inside another of the same kind behaves
+# differently from the other pairs.
+_GREEDY_OPENERS = frozenset("【《〖〔")
+# ASCII and common Chinese quote characters
+_QUOTES = '"\'“”‘’『』「」‹›«»'
+_QUOTE_TABLE = {ord(c): None for c in _QUOTES}
+_BRACKETS = "".join(_OPEN_TO_CLOSE) + "".join(_CLOSE_TO_OPEN)
+# An innermost bracket group: an opener, no brackets, the matching closer.
+_GROUP = "|".join(re.escape(o) + "[^" + re.escape(_BRACKETS) + "]*" + re.escape(c) for o, c in _OPEN_TO_CLOSE.items())
+_GROUP_RE = re.compile(_GROUP)
+_ANY_BRACKET_RE = re.compile("[" + re.escape(_BRACKETS) + "]")
+# Scanner token: a whole innermost group or a single bracket character.
+_BRACKET_RE = re.compile("(" + _GROUP + ")|[" + re.escape(_BRACKETS) + "]")
+# Fixed-point patterns, only used for lines whose brackets cross each other.
+_NESTED_PATTERNS = [re.compile(o + "[^" + (o if o not in _GREEDY_OPENERS else "") + c + "]*" + c)
+                    for o, c in ((re.escape(o), re.escape(c)) for o, c in _OPEN_TO_CLOSE.items())]
+_LEFTOVER_RE = re.compile("[" + re.escape(_BRACKETS) + "]+")
+# phrases like 学制4年, 学制 4 年, 学制12年 etc. (X is digits)
+_XUEZHI_RE = re.compile(r"学制\s*\d+\s*年")
+
+
+def _strip_fixed_point(s: str) -> str:
     prev = None
     while prev != s:
         prev = s
-        for p in patterns:
-            s = re.sub(p, "", s)
+        for p in _NESTED_PATTERNS:
+            s = p.sub("", s)
+    return _LEFTOVER_RE.sub("", s)
+
 
-    # remove any leftover standalone bracket characters
-    leftover = r"[\(\)\[\]\{\}<>（）【】《》〖〗〔〕]+"
-    s = re.sub(leftover, "", s)
-    return s
+def _strip(s: str) -> str:
+    """Remove bracketed segments and leftover bracket characters in one pass.
+
+    Lines made only of flat groups like 临床医学（八年）（江安校区） are handled by
+    a single substitution. Otherwise the line is scanned once: plain text
+    between tokens is copied as slices and `stack` holds (opener, number of
+    output pieces when it was opened), so the matching closer truncates the
+    output back to that point. Lines whose pairs cross, or that nest a 【《〖〔
+    pair inside one of its own kind, fall back to the old fixed-point
+    substitution so the result stays identical.
+    """
+    flat = _GROUP_RE.sub("", s)
+    if _ANY_BRACKET_RE.search(flat) is None:
+        return flat
+    pieces = []
+    stack = []
+    pos = 0
+    for m in _BRACKET_RE.finditer(s):
+        i = m.start()
+        if i > pos:
+            pieces.append(s[pos:i])
+        pos = m.end()
+        ch = s[i]
+        if m.group(1) is not None:
+            # innermost group, dropped as a whole
+            if stack and ch in _GREEDY_OPENERS and any(o == ch for o, _ in stack):
+                return _strip_fixed_point(s)
+        elif ch in _OPEN_TO_CLOSE:
+            if ch in _GREEDY_OPENERS and any(o == ch for o, _ in stack):
+                return _strip_fixed_point(s)
+            stack.append((ch, len(pieces)))
+        elif stack and stack[-1][0] == _CLOSE_TO_OPEN[ch]:
+            del pieces[stack.pop()[1]:]
+        elif any(o == _CLOSE_TO_OPEN[ch] for o, _ in stack):
+            return _strip_fixed_point(s)
+        # otherwise a closer without an opener: a leftover bracket, dropped
+    if pos < len(s):
+        pieces.append(s[pos:])
+    return "".join(pieces)
+
+
+def remove_parentheses_and_contents(s: str) -> str:
+    # Remove bracketed segments (innermost first for nested ones) for many
+    # bracket types, then any leftover standalone bracket characters.
+    return _strip(s)
 
 
 def remove_quotes(s: str) -> str:
     # remove ASCII and common Chinese quote characters
-    quotes = '"\'“”‘’『』「」‹›«»'
-    return s.translate({ord(c): None for c in quotes})
+    return s.translate(_QUOTE_TABLE)
+
+
+def clean_line(line: str) -> str:
+    """Brackets, quotes and 学制N年 removed in one pass, surrounding whitespace stripped."""
+    line = _strip(line).translate(_QUOTE_TABLE)
+    if "学制" in line:
+        line = _XUEZHI_RE.sub("", line)
+    return line.strip()
+
+
+def _clean_lines(lines):
+    """Clean an iterable of raw lines; returns (output text, total, skipped_hyphen, written)."""
+    out = []
+    total = 0
+    skipped_hyphen = 0
+    for raw_line in lines:
+        total += 1
+        if "-" in raw_line:
+            skipped_hyphen += 1
+            continue
+        line = clean_line(raw_line.rstrip("\n\r"))
+        if line == "":
+            continue
+        out.append(line + "\n")
+    return "".join(out), total, skipped_hyphen, len(out)
+
+
+def _clean_chunk(path: Path, enc: str, start: int, end: int):
+    """Worker: clean the lines in bytes [start, end) of `path`."""
+    with path.open("rb") as f:
+        f.seek(start)
+        return _clean_lines(_iter_lines(f, _LineDecoder(enc), end))
+
+
+def _chunk_ranges(path: Path, chunk_size: int, start: int = 0):
+    """Split `path` from byte `start` into ranges of about `chunk_size` bytes that end on a newline."""
+    size = path.stat().st_size
+    ranges = []
+    with path.open("rb") as f:
+        while start < size:
+            f.seek(min(start + chunk_size, size))
+            if f.tell() < size:
+                f.readline()  # move to the end of the current line
+            end = f.tell()
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def _clean_parallel(input_path: Path, enc: str, outf, workers: int, chunk_size: int, start: int = 0):
+    """Clean byte-range chunks in a process pool, writing results in input order.
+
+    At most 2 * workers chunks are in flight, so memory stays bounded by the
+    chunk size rather than the file size.
+    """
+    total = skipped_hyphen = written = 0
+    ranges = iter(_chunk_ranges(input_path, chunk_size, start))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque(pool.submit(_clean_chunk, input_path, enc, start, end)
+                        for start, end in itertools.islice(ranges, 2 * workers))
+        while pending:
+            text, t, s, w = pending.popleft().result()
+            for start, end in itertools.islice(ranges, 1):
+                pending.append(pool.submit(_clean_chunk, input_path, enc, start, end))
+            outf.write(text)
+            total += t
+            skipped_hyphen += s
+            written += w
+    return total, skipped_hyphen, written
+
+
+def _watermark_path(output_path: Path) -> Path:
+    return output_path.with_name(output_path.name + ".watermark.json")
+
 
+def _hash_prefix(path: Path, size: int, block_size: int = 1 << 20):
+    """sha256 object fed with the first `size` bytes of `path`."""
+    hasher = hashlib.sha256()
+    with path.open("rb") as f:
+        while size > 0:
+            block = f.read(min(block_size, size))
+            if not block:
+                break
+            hasher.update(block)
+            size -= len(block)
+    return hasher
 
-def clean_file(input_path: Path, output_path: Path):
-    enc = detect_encoding(input_path)
+
+def _resume_point(input_path: Path, output_path: Path):
+    """Return (watermark, hasher of the processed prefix) if the previous output
+    can be appended to, else None (the caller rebuilds from scratch)."""
+    try:
+        with _watermark_path(output_path).open("r", encoding="utf-8") as f:
+            mark = json.load(f)
+        in_size = input_path.stat().st_size
+        out_stat = output_path.stat()
+    except (OSError, ValueError):
+        return None
+    # the output must be exactly what the last run left (not replaced or half-appended)
+    if (out_stat.st_size, out_stat.st_mtime_ns) != (mark.get("output_size"), mark.get("output_mtime_ns")):
+        return None
+    if not mark.get("ends_with_newline") or in_size < mark.get("offset", in_size + 1):
+        return None
+    hasher = _hash_prefix(input_path, mark["offset"])
+    if hasher.hexdigest() != mark["prefix_sha256"]:
+        return None
+    return mark, hasher
+
+
+def clean_file(input_path: Path, output_path: Path, workers: int = 1, chunk_size: int = 8 << 20,
+               incremental: bool = False):
+    """Clean `input_path` into `output_path`.
+
+    With workers > 1 the input is split into ~chunk_size byte chunks on line
+    boundaries and cleaned in a process pool; output order and counters are
+    the same as the single-process path.
+
+    Every run records a watermark next to the output (byte offset and sha256
+    of the input processed so far). With incremental=True, if the input still
+    starts with exactly that prefix, only the new tail is cleaned and appended;
+    otherwise the output is rebuilt from scratch.
+
+    This only pays off when the raw file grows by appending (uploads or other
+    producers that write new rows at the end). Data_request.py rewrites the whole
+    file in school x year order and refetches the latest year for every school,
+    so after a crawl the prefix almost always differs and the clean is a full
+    rebuild. The result is still correct, it just isn't incremental.
+    """
+    started = time.perf_counter()
+    resume = _resume_point(input_path, output_path) if incremental else None
+    if resume is not None:
+        mark, hasher = resume
+        start = mark["offset"]
+        enc = mark["encoding"]
+        mode = "a"
+    else:
+        mark, hasher = None, hashlib.sha256()
+        start = 0
+        enc = detect_encoding(input_path)
+        mode = "w"
+    decoder = _LineDecoder(enc)
     total = 0
     skipped_hyphen = 0
     written = 0
-    with input_path.open("r", encoding=enc, errors="ignore") as inf, output_path.open("w", encoding="utf-8", newline="") as outf:
-        for raw_line in inf:
-            total += 1
-            if "-" in raw_line:
-                skipped_hyphen += 1
-                continue
-            line = raw_line.rstrip("\n\r")
-            line = remove_parentheses_and_contents(line)
-            line = remove_quotes(line)
-            # remove phrases like 学制4年, 学制 4 年, 学制12年 etc. (X is digits)
-            line = re.sub(r"学制\s*\d+\s*年", "", line)
-            line = line.strip()
-            if line == "":
-                continue
-            outf.write(line + "\n")
-            written += 1
+    with input_path.open("rb") as inf, output_path.open(mode, encoding="utf-8", newline="") as outf:
+        inf.seek(start)
+        if workers > 1:
+            end = input_path.stat().st_size
+            total, skipped_hyphen, written = _clean_parallel(input_path, enc, outf, workers, chunk_size, start)
+            while inf.tell() < end:
+                hasher.update(inf.read(min(1 << 20, end - inf.tell())))
+        else:
+            for raw_line in _iter_lines(inf, decoder, hasher=hasher):
+                total += 1
+                if "-" in raw_line:
+                    skipped_hyphen += 1
+                    continue
+                line = clean_line(raw_line.rstrip("\n\r"))
+                if line == "":
+                    continue
+                outf.write(line + "\n")
+                written += 1
+        offset = inf.tell()
+        if offset:
+            inf.seek(offset - 1)
+        ends_with_newline = inf.read(1) == b"\n"
+    out_stat = output_path.stat()
+
+    prev = mark or {"total": 0, "skipped_hyphen": 0, "written": 0}
+    new_mark = {
+        "offset": offset,
+        "prefix_sha256": hasher.hexdigest(),
+        "ends_with_newline": ends_with_newline,
+        "encoding": decoder.enc,
+        "output_size": out_stat.st_size,
+        "output_mtime_ns": out_stat.st_mtime_ns,
+        "total": prev["total"] + total,
+        "skipped_hyphen": prev["skipped_hyphen"] + skipped_hyphen,
+        "written": prev["written"] + written,
+    }
+    tmp = _watermark_path(output_path).with_suffix(".tmp")
+    with tmp.open("w", encoding="utf-8") as f:
+        json.dump(new_mark, f)
+    os.replace(tmp, _watermark_path(output_path))
+
+    elapsed = time.perf_counter() - started
+    if metrics.ENABLED:
+        metrics.observe("clean_file_seconds", elapsed, help="clean_file duration")
+        metrics.inc("clean_lines_read_total", total, help="input lines read")
+        metrics.inc("clean_lines_written_total", written, help="output lines written")
+        metrics.inc("clean_lines_skipped_total", skipped_hyphen, help="lines dropped", reason="hyphen")
+        metrics.inc("clean_lines_skipped_total", total - skipped_hyphen - written, help="lines dropped", reason="empty")
+        metrics.set_max("clean_lines_per_second", total / elapsed if elapsed > 0 else 0, help="best throughput")
 
     print(f"Input: {input_path}\nOutput: {output_path}")
+    if mark is not None:
+        print(f"Incremental: appended from byte {start} (previous lines: {prev['total']})")
     print(f"Total lines read: {total}")
     print(f"Skipped lines containing '-': {skipped_hyphen}")
     print(f"Lines written: {written}")
+    if metrics.ENABLED:
+        print(f"Throughput: {total / elapsed if elapsed > 0 else 0:,.0f} lines/s ({elapsed:.3f} s)")
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Clean 招生数据.csv into 招生数据_clean.csv")
+    parser.add_argument("--workers", type=int, default=1, help="process pool size (1 = single process)")
+    parser.add_argument("--chunk-mb", type=int, default=8, help="chunk size in MB for --workers > 1")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only clean lines appended since the last run (full rebuild if the input changed)")
+    args = parser.parse_args()
+    metrics.dump_at_exit("clean")
+
     base = Path(__file__).parent
     inp = base / "招生数据.csv"
     out = base / "招生数据_clean.csv"
     if not inp.exists():
         print(f"源文件未找到: {inp}")
     else:
-        clean_file(inp, out)
+        clean_file(inp, out, workers=args.workers, chunk_size=args.chunk_mb << 20, incremental=args.incremental)
+        print(metrics.report(), end="")
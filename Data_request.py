@@ -1,9 +1,53 @@
+import os
+import json
+import datetime
+import csv
 import requests
-import pandas as pd
 import time
+import math
+import random
+import argparse
+import itertools
+import threading
+from collections import deque
+from urllib.parse import urlsplit, urlunsplit, parse_qs
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 from fake_useragent import UserAgent
-all_data = []
+
+import metrics
 # 请求 URL
+URLS = [
+    'https://api.zjzw.cn/web/api/?like_spname=&local_batch_id=7&local_province_id=51&local_type_id=1&page=1&school_id=99&size=10&sp_xuanke=&special_group=&uri=apidata/api/gk/score/special&year=2020',
+    # 四川大学
+    'https://api.zjzw.cn/web/api/?like_spname=&local_batch_id=7&local_province_id=51&local_type_id=1&page=1&school_id=661&size=10&sp_xuanke=&special_group=&uri=apidata/api/gk/score/special&year=2020',
+    # 电子科技大学
+    'https://api.zjzw.cn/web/api/?like_spname=&local_batch_id=7&local_province_id=51&local_type_id=1&page=1&school_id=264&size=10&sp_xuanke=&special_group=&uri=apidata/api/gk/score/special&year=2020',
+    # 成都中医药大学
+    'https://api.zjzw.cn/web/api/?like_spname=&local_batch_id=7&local_province_id=51&local_type_id=1&page=1&school_id=101&size=10&sp_xuanke=&special_group=&uri=apidata/api/gk/score/special&year=2020',
+    # 西南财经大学
+    'https://api.zjzw.cn/web/api/?like_spname=&local_batch_id=7&local_province_id=51&local_type_id=1&page=1&school_id=51&size=10&sp_xuanke=&special_group=&uri=apidata/api/gk/score/special&year=2020',
+    # 西南交通大学
+    'https://api.zjzw.cn/web/api/?like_spname=&local_batch_id=7&local_province_id=51&local_type_id=1&page=1&school_id=263&size=10&sp_xuanke=&special_group=&uri=apidata/api/gk/score/special&year=2020',
+    # 西南科技大学
+    'https://api.zjzw.cn/web/api/?like_spname=&local_batch_id=7&local_province_id=51&local_type_id=1&page=1&school_id=2491&size=10&sp_xuanke=&special_group=&uri=apidata/api/gk/score/special&year=2020',
+    # 成都大学
+    'https://api.zjzw.cn/web/api/?like_spname=&local_batch_id=7&local_province_id=51&local_type_id=1&page=1&school_id=270&size=10&sp_xuanke=&special_group=&uri=apidata/api/gk/score/special&year=2020',
+    # 成都信息工程大学
+    'https://api.zjzw.cn/web/api/?like_spname=&local_batch_id=7&local_province_id=51&local_type_id=1&page=1&school_id=273&size=10&sp_xuanke=&special_group=&uri=apidata/api/gk/score/special&year=2020',
+    # 四川轻化工大学
+    'https://api.zjzw.cn/web/api/?like_spname=&local_batch_id=7&local_province_id=51&local_type_id=1&page=1&school_id=245&size=10&sp_xuanke=&special_group=&uri=apidata/api/gk/score/special&year=2020',
+    # 西华大学
+    'https://api.zjzw.cn/web/api/?like_spname=&local_batch_id=7&local_province_id=51&local_type_id=1&page=1&school_id=100&size=10&sp_xuanke=&special_group=&uri=apidata/api/gk/score/special&year=2020',
+    # 四川农业大学
+]
+
+# 输出 CSV 的列（与 parse_items 中的字段一一对应）
+COLUMNS = ["学校", "专业", "最低分", "平均分", "最高分", "招生年份", "科类", "批次", "最低位次", "省控线", "专业类别"]
+
+# 爬取的招生年份；增量爬取时默认只有最近一年视为仍会变化
+YEARS = range(2020, 2025)
+
 
 def update_url(url, year1, page):
     # 替换年份和页数
@@ -12,61 +56,408 @@ def update_url(url, year1, page):
     return url
 
 
-if __name__ == '__main__':
-    urls = [
-        'https://api.zjzw.cn/web/api/?like_spname=&local_batch_id=7&local_province_id=51&local_type_id=1&page=1&school_id=99&size=10&sp_xuanke=&special_group=&uri=apidata/api/gk/score/special&year=2020',
-        # 四川大学
-        'https://api.zjzw.cn/web/api/?like_spname=&local_batch_id=7&local_province_id=51&local_type_id=1&page=1&school_id=661&size=10&sp_xuanke=&special_group=&uri=apidata/api/gk/score/special&year=2020',
-        # 电子科技大学
-        'https://api.zjzw.cn/web/api/?like_spname=&local_batch_id=7&local_province_id=51&local_type_id=1&page=1&school_id=264&size=10&sp_xuanke=&special_group=&uri=apidata/api/gk/score/special&year=2020',
-        # 成都中医药大学
-        'https://api.zjzw.cn/web/api/?like_spname=&local_batch_id=7&local_province_id=51&local_type_id=1&page=1&school_id=101&size=10&sp_xuanke=&special_group=&uri=apidata/api/gk/score/special&year=2020',
-        # 西南财经大学
-        'https://api.zjzw.cn/web/api/?like_spname=&local_batch_id=7&local_province_id=51&local_type_id=1&page=1&school_id=51&size=10&sp_xuanke=&special_group=&uri=apidata/api/gk/score/special&year=2020',
-        # 西南交通大学
-        'https://api.zjzw.cn/web/api/?like_spname=&local_batch_id=7&local_province_id=51&local_type_id=1&page=1&school_id=263&size=10&sp_xuanke=&special_group=&uri=apidata/api/gk/score/special&year=2020',
-        # 西南科技大学
-        'https://api.zjzw.cn/web/api/?like_spname=&local_batch_id=7&local_province_id=51&local_type_id=1&page=1&school_id=2491&size=10&sp_xuanke=&special_group=&uri=apidata/api/gk/score/special&year=2020',
-        # 成都大学
-        'https://api.zjzw.cn/web/api/?like_spname=&local_batch_id=7&local_province_id=51&local_type_id=1&page=1&school_id=270&size=10&sp_xuanke=&special_group=&uri=apidata/api/gk/score/special&year=2020',
-        # 成都信息工程大学
-        'https://api.zjzw.cn/web/api/?like_spname=&local_batch_id=7&local_province_id=51&local_type_id=1&page=1&school_id=273&size=10&sp_xuanke=&special_group=&uri=apidata/api/gk/score/special&year=2020',
-        # 四川轻化工大学
-        'https://api.zjzw.cn/web/api/?like_spname=&local_batch_id=7&local_province_id=51&local_type_id=1&page=1&school_id=245&size=10&sp_xuanke=&special_group=&uri=apidata/api/gk/score/special&year=2020',
-        # 西华大学
-        'https://api.zjzw.cn/web/api/?like_spname=&local_batch_id=7&local_province_id=51&local_type_id=1&page=1&school_id=100&size=10&sp_xuanke=&special_group=&uri=apidata/api/gk/score/special&year=2020',
-        # 四川农业大学
-    ]
-    # 遍历年份和页数的范围
+def with_base_url(url, base_url):
+    """把 url 的协议和主机替换为 base_url（例如本地模拟接口 http://127.0.0.1:8000）。"""
+    if not base_url:
+        return url
+    parts = urlsplit(url)
+    base = urlsplit(base_url)
+    return urlunsplit((base.scheme, base.netloc, parts.path, parts.query, parts.fragment))
+
+
+def parse_items(data):
+    """把接口返回的 JSON 转换成行（dict 列表）；数据为空或格式不匹配时返回 None。"""
+    if "data" in data and "item" in data["data"]:
+        rows = []
+        for item in data["data"]["item"]:
+            rows.append({
+                "学校": item.get("name", ""),
+                "专业": item.get("spname", ""),
+                "最低分": item.get("min", ""),
+                "平均分": item.get("average", ""),
+                "最高分": item.get("max", ""),
+                "招生年份": item.get("year", ""),
+                "科类": item.get("local_type_name", ""),
+                "批次": item.get("local_batch_name", ""),
+                "最低位次": item.get("min_section", ""),
+                "省控线": item.get("proscore", ""),
+                "专业类别": item.get("level3_name", ""),
+            })
+        return rows
+    return None
+
+
+def page_size(url):
+    """从 URL 的 size 参数读取每页条数（默认 10）。"""
+    try:
+        return int(parse_qs(urlsplit(url).query).get("size", ["10"])[0])
+    except ValueError:
+        return 10
+
+
+def page_count(data, size):
+    """根据接口返回的总条数（numFound/total/count）计算页数；没有总数字段时返回 None。"""
+    body = data.get("data") if isinstance(data, dict) else None
+    if not isinstance(body, dict):
+        return None
+    for key in ("numFound", "total", "count"):
+        if key in body:
+            try:
+                return max(1, math.ceil(int(body[key]) / size))
+            except (TypeError, ValueError):
+                return None
+    return None
+
+
+class HostLimiter:
+    """按主机限制并发请求数，每个主机一个信号量。"""
+
+    def __init__(self, per_host):
+        self.per_host = per_host
+        self._lock = threading.Lock()
+        self._sems = {}
+
+    def get(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            sem = self._sems.get(host)
+            if sem is None:
+                sem = self._sems[host] = threading.BoundedSemaphore(self.per_host)
+        return sem
+
+
+def build_session(pool_size=10):
+    """创建复用连接的 Session，连接池大小与每主机并发数一致。"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def job_key(url, year1=None):
+    """从 URL 取出 (school_id, year, page)；year1 不为 None 时以其为年份。"""
+    q = parse_qs(urlsplit(url).query)
+    year = year1 if year1 is not None else q.get("year", ["0"])[0]
+    return q.get("school_id", [""])[0], int(year), int(q.get("page", ["1"])[0])
+
+
+class ResponseCache:
+    """接口响应的磁盘缓存，按 (school_id, year, page) 存为 JSON 文件，并维护断点清单。
+
+    清单 manifest.json 记录本轮已完整抓取的 (school_id, year)；上一轮未正常结束时
+    （finished 为 False），这些任务直接从缓存读取，实现断点续爬。
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.manifest_path = os.path.join(root, "manifest.json")
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        self.resumed = set()
+        manifest = self._read_json(self.manifest_path)
+        if manifest and not manifest.get("finished", True):
+            self.resumed = set(manifest.get("completed", {}))
+            self.manifest = manifest
+        else:
+            self.manifest = {"started": datetime.datetime.now().isoformat(timespec="seconds"),
+                             "finished": False, "completed": {}}
+        self._write_json(self.manifest_path, self.manifest)
+
+    @staticmethod
+    def _read_json(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _write_json(path, obj):
+        # 先写临时文件再替换，中途崩溃不会留下半个文件
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(obj, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    def path(self, key):
+        school_id, year, page = key
+        return os.path.join(self.root, str(school_id), f"{year}_{page}.json")
+
+    def get(self, key):
+        return self._read_json(self.path(key))
+
+    def put(self, key, data):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._write_json(path, data)
+
+    def is_resumed(self, key):
+        return f"{key[0]}:{key[1]}" in self.resumed
+
+    def mark_done(self, school_id, year, n_rows):
+        with self._lock:
+            self.manifest["completed"][f"{school_id}:{year}"] = n_rows
+            self._write_json(self.manifest_path, self.manifest)
+
+    def finish(self):
+        with self._lock:
+            self.manifest["finished"] = True
+            self._write_json(self.manifest_path, self.manifest)
+
+
+class Crawler:
+    """并发爬取引擎：共享一个连接池 Session 和一个 UserAgent，按主机限流，失败按指数退避重试。
+
+    退避等待发生在释放主机信号量之后，不占用连接，其他任务照常进行。
+    传入 cache 时成功的响应会写入磁盘缓存；incremental 为 True 时只请求缓存中缺失
+    或年份属于 mutable_years（默认 YEARS 中最近一年）的页，其余直接读缓存。
+    """
+
+    def __init__(self, max_workers=8, per_host=4, retries=3, backoff=1.0, timeout=10, max_pages=100, session=None,
+                 cache=None, incremental=False, mutable_years=None):
+        self.max_workers = max_workers
+        self.cache = cache
+        self.incremental = incremental
+        self.mutable_years = set(mutable_years) if mutable_years is not None else {max(YEARS)}
+        self.requests = 0
+        self.cache_hits = 0
+        self._stats_lock = threading.Lock()
+        self.max_pages = max_pages
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.limiter = HostLimiter(per_host)
+        self.session = session or build_session(per_host)
+        self.ua = UserAgent()
+
+    def fetch_json(self, url):
+        """请求一个 URL 并返回 JSON；全部重试失败时返回 None。"""
+        for attempt in range(self.retries + 1):
+            if attempt:
+                metrics.inc('crawl_retries_total', help='重试次数')
+                # 指数退避 + 随机抖动，避免同时重试
+                time.sleep(self.backoff * (2 ** (attempt - 1)) * (1 + random.random()))
+            headers = {
+                'User-Agent': self.ua.random  # 伪装
+            }
+            try:
+                with self.limiter.get(url):
+                    with metrics.timed('crawl_request_seconds', help='单次 HTTP 请求耗时'):
+                        res = self.session.get(url, headers=headers, timeout=self.timeout)
+                metrics.inc('crawl_requests_total', help='HTTP 请求数（按状态码）', status=str(res.status_code))
+                metrics.inc('crawl_response_bytes_total', len(res.content), help='响应体字节数')
+            except requests.exceptions.RequestException as e:
+                metrics.inc('crawl_requests_total', help='HTTP 请求数（按状态码）', status='error')
+                print(f" 请求异常: {e}")
+                continue
+            if res.status_code != 200:
+                print(f" 请求失败，状态码：{res.status_code}, URL: {url}")
+                continue
+            try:
+                return res.json()
+            except ValueError as e:
+                # 请求本身已按 status="200" 计数，解析失败另外计数，不重复记为 error
+                metrics.inc('crawl_json_errors_total', help='状态码 200 但响应不是合法 JSON 的次数')
+                print(f" 响应解析失败: {e}")
+        return None
+
+    def use_cached(self, key):
+        if self.cache is None:
+            return False
+        if self.cache.is_resumed(key):
+            return True
+        return self.incremental and key[1] not in self.mutable_years
+
+    def fetch_page(self, url):
+        """请求一页（可命中缓存），返回 (行列表, 原始 JSON)。"""
+        key = job_key(url)
+        if self.use_cached(key):
+            data = self.cache.get(key)
+            if data is not None:
+                with self._stats_lock:
+                    self.cache_hits += 1
+                metrics.inc('crawl_cache_hits_total', help='命中响应缓存的页数')
+                return parse_items(data) or [], data
+        print(url)
+        with self._stats_lock:
+            self.requests += 1
+        data = self.fetch_json(url)
+        if data is None:
+            return [], None
+        rows = parse_items(data)
+        if rows is None:
+            print(f" 数据为空或格式不匹配: {url}")
+            return [], data
+        if self.cache is not None:
+            self.cache.put(key, data)
+        return rows, data
+
+    def fetch_rows(self, url):
+        return self.fetch_page(url)[0]
+
+    def walk_pages(self, url, year1, size, start=2):
+        """没有总数字段时逐页请求，遇到不满一页或空页即停止。"""
+        rows = []
+        for page in range(start, self.max_pages + 1):
+            page_rows = self.fetch_rows(update_url(url, year1, page))
+            rows.extend(page_rows)
+            if len(page_rows) < size:
+                break
+        return rows
+
+    def start_job(self, pool, url, year1):
+        """请求第 1 页，并把其余页提交到线程池（不等待），返回 (第 1 页行, 第 1 页 JSON, 其余页的 futures)。
+
+        有总条数时按页数并发请求其余页，否则交给 walk_pages 逐页探测。
+        """
+        rows, data = self.fetch_page(update_url(url, year1, 1))
+        size = page_size(url)
+        if data is None or len(rows) < size:
+            return rows, data, []
+        n_pages = page_count(data, size)
+        if n_pages is None:
+            return rows, data, [pool.submit(self.walk_pages, url, year1, size)]
+        n_pages = min(n_pages, self.max_pages)
+        return rows, data, [pool.submit(self.fetch_rows, update_url(url, year1, page))
+                            for page in range(2, n_pages + 1)]
+
+    def iter_jobs(self, urls, years=YEARS, window=None):
+        """按 urls × years 的顺序逐个产出每个 (学校, 年份) 的全部行（自适应分页）。
+
+        最多同时有 window 个 (学校, 年份) 在途，内存占用与总任务数无关；
+        某个任务的行被调用方取走后才记入断点清单。
+        """
+        window = window or self.max_workers * 4
+        jobs = [(url, year1) for url in urls for year1 in years]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            pending = deque()
+            it = iter(jobs)
+            for job in itertools.islice(it, window):
+                pending.append((job, pool.submit(self.start_job, pool, *job)))
+            while pending:
+                (url, year1), fut = pending.popleft()
+                rows, data, futures = fut.result()
+                job_rows = list(rows)
+                for page_fut in futures:
+                    job_rows.extend(page_fut.result())
+                for job in itertools.islice(it, 1):
+                    pending.append((job, pool.submit(self.start_job, pool, *job)))
+                yield job_rows
+                if self.cache is not None and data is not None:
+                    self.cache.mark_done(job_key(url)[0], year1, len(job_rows))
+        if self.cache is not None:
+            self.cache.finish()
+
+    def crawl(self, urls, years=YEARS, pages=None):
+        """并发抓取 urls × years 的全部分页，返回顺序与顺序爬取一致的行列表。
+
+        pages 为 None 时自适应分页（见 iter_jobs）；指定 pages 时只请求这些页。
+        """
+        if pages is None:
+            return [row for rows in self.iter_jobs(urls, years) for row in rows]
+        tasks = [update_url(url, year1, page) for url in urls for year1 in years for page in pages]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            results = list(pool.map(self.fetch_rows, tasks))
+        return [row for rows in results for row in rows]
+
+
+class RowSink:
+    """流式写出爬取结果：行先进入缓冲区，满 buffer_rows 行写入临时文件 `<path>.part`，
+    close 时原子替换为目标文件；可选同时写 Parquet（需要 pyarrow）。
+
+    出错时目标文件保持不变，已写出的部分留在 `.part` 文件中；没有任何行时不生成文件。
+    """
+
+    def __init__(self, path, columns=COLUMNS, buffer_rows=1000, parquet_path=None):
+        self.path = path
+        self.columns = columns
+        self.buffer_rows = buffer_rows
+        self.parquet_path = parquet_path
+        self.rows_written = 0
+        self._buffer = []
+        self._tmp = f"{path}.part"
+        self._file = open(self._tmp, "w", encoding="UTF-8", newline="")
+        self._writer = csv.writer(self._file, lineterminator="\n")
+        self._writer.writerow(columns)
+        self._pq_writer = None
+        if parquet_path:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            self._pa = pa
+            self._pq_schema = pa.schema([(c, pa.string()) for c in columns])
+            self._pq_tmp = f"{parquet_path}.part"
+            self._pq_writer = pq.ParquetWriter(self._pq_tmp, self._pq_schema)
+
+    def write(self, rows):
+        self._buffer.extend(rows)
+        if len(self._buffer) >= self.buffer_rows:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer:
+            return
+        values = [[row.get(c, "") for c in self.columns] for row in self._buffer]
+        self._writer.writerows(values)
+        self._file.flush()
+        if self._pq_writer is not None:
+            cols = list(zip(*values))
+            arrays = [self._pa.array([None if v is None or v == "" else str(v) for v in col], type=self._pa.string())
+                      for col in cols]
+            self._pq_writer.write_table(self._pa.Table.from_arrays(arrays, schema=self._pq_schema))
+        self.rows_written += len(self._buffer)
+        self._buffer = []
+
+    def close(self):
+        self.flush()
+        self._file.close()
+        if self._pq_writer is not None:
+            self._pq_writer.close()
+        if self.rows_written == 0:
+            os.remove(self._tmp)
+            if self._pq_writer is not None:
+                os.remove(self._pq_tmp)
+            return False
+        os.replace(self._tmp, self.path)
+        if self._pq_writer is not None:
+            os.replace(self._pq_tmp, self.parquet_path)
+        return True
+
+    def abort(self):
+        self.flush()
+        self._file.close()
+        if self._pq_writer is not None:
+            self._pq_writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+def crawl_sequential(urls, years=YEARS, pages=range(1, 6)):
+    """原先的逐个请求循环（每次新建连接和 UserAgent），仅用于性能对比。"""
+    rows = []
     for url in urls:
-       for year1 in range(2020, 2025):
-          for page in range(1, 6):
+        for year1 in years:
+            for page in pages:
                 updated_url = update_url(url, year1, page)
                 print(updated_url)
                 ua = UserAgent()
-                print(ua.random)  # 随机产生
                 headers = {
                     'User-Agent': ua.random  # 伪装
                 }
                 try:
                     res = requests.get(updated_url, headers=headers, timeout=10)
                     if res.status_code == 200:
-                        data = res.json()
-                        if "data" in data and "item" in data["data"]:
-                            for item in data["data"]["item"]:
-                                all_data.append({
-                                    "学校": item.get("name", ""),
-                                    "专业": item.get("spname", ""),
-                                    "最低分": item.get("min", ""),
-                                    "平均分": item.get("average", ""),
-                                    "最高分": item.get("max", ""),
-                                    "招生年份": item.get("year", ""),
-                                    "科类": item.get("local_type_name", ""),
-                                    "批次": item.get("local_batch_name", ""),
-                                    "最低位次": item.get("min_section", ""),
-                                    "省控线": item.get("proscore", ""),
-                                    "专业类别": item.get("level3_name", ""),
-                                })
+                        items = parse_items(res.json())
+                        if items is not None:
+                            rows.extend(items)
                         else:
                             print(f" 数据为空或格式不匹配: {updated_url}")
                     else:
@@ -75,8 +466,36 @@ if __name__ == '__main__':
                 except requests.exceptions.RequestException as e:
                     print(f" 请求异常: {e}")
                     time.sleep(5)  # 请求异常时等待 5 秒
-    # **存储为 CSV 文件**
-    if all_data:
-        df = pd.DataFrame(all_data)
-        df.to_csv("招生数据.csv", index=False, encoding="UTF-8")
-        print(" 数据已保存为 CSV 文件：招生数据.csv")
+    return rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="爬取高考专业录取分数")
+    parser.add_argument("--base-url", default=None, help="替换接口地址（如本地模拟接口 http://127.0.0.1:8000）")
+    parser.add_argument("--workers", type=int, default=8, help="线程池大小")
+    parser.add_argument("--per-host", type=int, default=4, help="每个主机的最大并发请求数")
+    parser.add_argument("--cache-dir", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), ".crawl_cache"),
+                        help="响应缓存与断点清单目录")
+    parser.add_argument("--no-cache", action="store_true", help="不读写磁盘缓存")
+    parser.add_argument("--incremental", action="store_true", help="只请求缓存缺失或仍可能变化（最近一年）的页")
+    parser.add_argument("--mutable-years", type=int, nargs="*", default=None, help=f"视为仍会变化的年份（默认 {max(YEARS)}）")
+    parser.add_argument("--buffer-rows", type=int, default=1000, help="写出前最多缓冲的行数")
+    parser.add_argument("--parquet", default=None, help="同时写出 Parquet 文件的路径（需要 pyarrow）")
+    args = parser.parse_args()
+    metrics.dump_at_exit('crawl')
+
+    urls = [with_base_url(u, args.base_url) for u in URLS]
+    cache = None if args.no_cache else ResponseCache(args.cache_dir)
+    if cache is not None and cache.resumed:
+        print(f" 从断点继续：已完成 {len(cache.resumed)} 个 (学校, 年份)")
+    crawler = Crawler(max_workers=args.workers, per_host=args.per_host, cache=cache,
+                      incremental=args.incremental, mutable_years=args.mutable_years)
+    # **边爬边写 CSV 文件**，完成后原子替换
+    sink = RowSink("招生数据.csv", buffer_rows=args.buffer_rows, parquet_path=args.parquet)
+    with sink, metrics.timed('crawl_run_seconds', help='整次爬取耗时'):
+        for rows in crawler.iter_jobs(urls):
+            sink.write(rows)
+    print(f" 网络请求 {crawler.requests} 次，缓存命中 {crawler.cache_hits} 次")
+    if sink.rows_written:
+        print(f" 数据已保存为 CSV 文件：招生数据.csv（{sink.rows_written} 行）")
+    print(metrics.report(), end='')
@@ -1,10 +1,30 @@
 # -*- coding: utf-8 -*-
 import os
+import io
+import argparse
+import copy
+import csv
+import functools
+import hashlib
+import inspect
+import shutil
+import weakref
+import json
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 from matplotlib import font_manager
 import matplotlib
+import matplotlib.colors
+import matplotlib.ticker
+
+import metrics
+from output_capture import capture as capture_output
 
 
 
@@ -16,25 +36,700 @@ OUT_DIR = os.path.join(os.path.dirname(__file__), 'figures')
 os.makedirs(OUT_DIR, exist_ok=True)
 
 NUMERIC_COLS = ['最低分', '平均分', '最高分', '最低位次', '省控线', '招生年份']
+CATEGORY_COLS = ['学校', '专业', '科类', '批次', '专业类别']
+_INT_DTYPES = [np.dtype(t) for t in (np.int8, np.int16, np.int32, np.int64)]
+
+
+def _numeric_dtype(has_na, integral, lo, hi):
+    """数值列的存储类型：没有缺失且全为整数时取能容纳 [lo, hi] 的最小整数类型，否则 float64。"""
+    if not has_na and integral:
+        for dt in _INT_DTYPES:
+            info = np.iinfo(dt)
+            if info.min <= lo and hi <= info.max:
+                return dt
+    return np.dtype('float64')
+
+
+def _optimize_dtypes(df):
+    """文本列转为 category，数值列在不损失精度时降为最小整数类型（可重复调用）。"""
+    for c in CATEGORY_COLS:
+        if c in df.columns and not isinstance(df[c].dtype, pd.CategoricalDtype):
+            df[c] = df[c].astype('category')
+    for c in NUMERIC_COLS:
+        if c in df.columns and len(df):
+            col = df[c]
+            has_na = bool(col.isna().any())
+            integral = not has_na and bool((col % 1 == 0).all())
+            dt = _numeric_dtype(has_na, integral, col.min(), col.max())
+            if col.dtype != dt:
+                df[c] = col.astype(dt)
+    return df
+
+
+def _cache_path(path):
+    return path + '.cache.feather'
+
+
+def _source_key(path):
+    st = os.stat(path)
+    return {'mtime_ns': st.st_mtime_ns, 'size': st.st_size}
 
 
-def load_and_clean(path=DATA_PATH):
-    df = pd.read_csv(path)
+def _read_cache(path):
+    """源 CSV 的 mtime 和大小与缓存记录一致时读取列式缓存，否则返回 None。"""
+    try:
+        import pyarrow.feather as feather
+        cache = _cache_path(path)
+        table = feather.read_table(cache)
+        meta = json.loads(table.schema.metadata[b'source'])
+        if meta != _source_key(path):
+            return None
+        return _optimize_dtypes(table.to_pandas())
+    except (ImportError, OSError, KeyError, ValueError, TypeError):
+        return None
+
+
+def _write_cache(df, path, key=None):
+    """把已转换类型的 DataFrame 写成 Feather 缓存（需要 pyarrow，没有时跳过）。"""
+    try:
+        import pyarrow as pa
+        import pyarrow.feather as feather
+    except ImportError:
+        return
+    table = pa.Table.from_pandas(df)
+    meta = dict(table.schema.metadata or {})
+    meta[b'source'] = json.dumps(key or _source_key(path)).encode()
+    table = table.replace_schema_metadata(meta)
+    tmp = _cache_path(path) + '.tmp'
+    try:
+        feather.write_feather(table, tmp)
+        os.replace(tmp, _cache_path(path))
+    except OSError:
+        pass
+
+
+def _parse_csv(src, names=None):
+    """解析 CSV（路径或二进制文件对象）并转换类型；names 不为 None 时表示数据没有表头。"""
+    with metrics.timed('analysis_parse_seconds', help='解析 CSV 并转换类型的耗时'):
+        if names is None:
+            df = pd.read_csv(src)
+        else:
+            df = pd.read_csv(src, header=None, names=names)
+        return _optimize_dtypes(_coerce_numeric(df))
+
+
+def _coerce_numeric(df):
     # 尝试将可能为数字的列转换为数值类型
     for c in NUMERIC_COLS:
         if c in df.columns:
             df[c] = pd.to_numeric(df[c], errors='coerce')
     # 去除完全为空的列/行（如果有需要）
-    df = df.dropna(how='all')
+    return df.dropna(how='all')
+
+
+def load_and_clean(path=DATA_PATH, use_cache=True):
+    """读取清洗后的 CSV，数值列转为数值类型，文本列转为 category。
+
+    use_cache 为 True 时优先读取同目录下的 Feather 缓存（按 CSV 的 mtime 和大小判断是否
+    过期），过期或不存在时解析 CSV 并重建缓存。
+    """
+    started = time.perf_counter()
+    if use_cache:
+        df = _read_cache(path)
+        if df is not None:
+            metrics.observe('analysis_load_seconds', time.perf_counter() - started, help='加载数据集的耗时', source='cache')
+            return df
+        key = _source_key(path)
+    df = _parse_csv(path)
+    if use_cache:
+        _write_cache(df, path, key)
+    metrics.observe('analysis_load_seconds', time.perf_counter() - started, help='加载数据集的耗时', source='csv')
     return df
 
 
-def summary_stats(df):
+class UploadError(ValueError):
+    """上传的 CSV 不符合要求（编码、表头、字段数或数值列）。"""
+
+
+class CsvIngest:
+    """边接收边校验上传的清洗后 CSV，同时写出 CSV 和 Feather 缓存，最后原子替换 path。
+
+    可作为 werkzeug FormDataParser 的 stream_factory 返回值：上传的字节直接 write() 进来，
+    按 block_size 切成整行的块，每块检查表头列、字段数和数值列，通过后原样追加到临时 CSV，
+    并转换为一个 Arrow record batch 写入临时缓存。内存只和 block_size 有关，与文件大小无关。
+
+    校验失败时记录 error，之后的数据直接丢弃；commit() 抛出 UploadError，discard() 删除临时文件。
+    """
+
+    def __init__(self, path=DATA_PATH, block_size=1 << 20):
+        self.path = path
+        self.block_size = block_size
+        self.rows = 0
+        self.error = None
+        self._pending = b''
+        self._columns = None
+        self._line = 1  # 已处理的行数（含表头），用于错误提示
+        tag = os.urandom(4).hex()  # 同时有多个上传时临时文件互不冲突
+        self._csv_tmp = f'{path}.upload-{tag}.tmp'
+        self._batches_tmp = f'{_cache_path(path)}.upload-{tag}.tmp'
+        self._cache_tmp = f'{_cache_path(path)}.{tag}.tmp'
+        self._csv = open(self._csv_tmp, 'wb')
+        self._writer = None
+        self._batches = None
+        self._schema = None
+
+    # werkzeug 写完上传内容后会 seek(0)，这里不需要回读
+    def seek(self, *args):
+        return 0
+
+    def write(self, data):
+        if self.error is None and data:
+            self._pending += data
+            if len(self._pending) >= self.block_size:
+                cut = self._pending.rfind(b'\n') + 1
+                if cut:
+                    block, self._pending = self._pending[:cut], self._pending[cut:]
+                    self._guard(self._feed, block)
+        return len(data)
+
+    def _guard(self, func, *args):
+        try:
+            func(*args)
+        except UploadError as e:
+            self.error = str(e)
+            self._pending = b''
+
+    def _feed(self, block):
+        try:
+            text = block.decode('utf-8')
+        except UnicodeDecodeError:
+            raise UploadError('文件不是 UTF-8 编码（原始数据请先用 Clean_Data.py 清洗）') from None
+        if text.count('"') % 2:
+            # 引号内的字段跨越了块边界，留到下一块一起处理
+            if len(block) > 64 * self.block_size:
+                raise UploadError('引号没有闭合')
+            self._pending = block + self._pending
+            return
+        body = block
+        if self._columns is None:
+            text = self._header(text)
+            body = text.encode('utf-8')
+        if text:
+            self._check_rows(text)
+            self._csv.write(body)
+            self._line += text.count('\n')
+
+    def _header(self, text):
+        text = text.lstrip('\ufeff')
+        first, _, rest = text.partition('\n')
+        columns = [c.strip() for c in next(csv.reader([first]), [])]
+        expected = CATEGORY_COLS + NUMERIC_COLS
+        missing = [c for c in expected if c not in columns]
+        extra = [c for c in columns if c not in expected]
+        if missing or extra or len(set(columns)) != len(columns):
+            raise UploadError(f'表头应为 {",".join(expected)}（顺序不限）；缺少 {missing}，多出 {extra}')
+        self._columns = columns
+        self._csv.write((','.join(columns) + '\n').encode('utf-8'))
+        return rest
+
+    def _check_rows(self, text):
+        n = len(self._columns)
+        reader = csv.reader(io.StringIO(text))
+        for row in reader:
+            if row and len(row) != n:
+                raise UploadError(f'第 {self._line + reader.line_num} 行有 {len(row)} 个字段，应为 {n} 个')
+        try:
+            df = pd.read_csv(io.StringIO(text), header=None, names=self._columns, dtype=str)
+        except pd.errors.ParserError as e:
+            raise UploadError(f'第 {self._line + 1} 行之后的内容无法解析：{e}') from None
+        for c in NUMERIC_COLS:
+            values = pd.to_numeric(df[c], errors='coerce')
+            bad = values.isna() & df[c].notna()
+            if bad.any():
+                i = int(np.flatnonzero(bad.to_numpy())[0])
+                raise UploadError(f'约第 {self._line + i + 1} 行：{c} 的值 {df[c].iloc[i]!r} 不是数字')
+            df[c] = values.astype('float64')
+        df = df.dropna(how='all')
+        self.rows += len(df)
+        self._write_batch(df)
+
+    def _write_batch(self, df):
+        try:
+            import pyarrow as pa
+        except ImportError:
+            return  # 没有 pyarrow 时只写 CSV，缓存在第一次加载时重建
+        if self._batches is None:
+            self._schema = pa.schema([(c, pa.float64() if c in NUMERIC_COLS else pa.string()) for c in self._columns])
+            self._batches = open(self._batches_tmp, 'wb')
+            self._writer = pa.ipc.new_stream(self._batches, self._schema)
+        self._writer.write_batch(pa.RecordBatch.from_pandas(df, schema=self._schema, preserve_index=False))
+
+    def _close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        for f in (self._csv, self._batches):
+            if f is not None and not f.closed:
+                f.close()
+
+    def discard(self):
+        self._close()
+        for p in (self._csv_tmp, self._batches_tmp, self._cache_tmp):
+            try:
+                os.remove(p)
+            except OSError:
+                pass
+
+    def commit(self):
+        """处理剩余数据；校验通过则替换 path 和它的 Feather 缓存，返回行数，否则抛出 UploadError。"""
+        try:
+            if self.error is None and self._pending:
+                block, self._pending = self._pending, b''
+                if not block.endswith(b'\n'):
+                    block += b'\n'
+                self._guard(self._feed, block)
+            if self.error is None and self._pending:
+                self.error = '文件末尾的引号没有闭合'
+            if self.error is None and self._columns is None:
+                self.error = '文件为空'
+            if self.error is not None:
+                raise UploadError(self.error)
+            self._close()
+            has_cache = self._finish_cache()
+            os.replace(self._csv_tmp, self.path)
+            if has_cache:
+                os.replace(self._cache_tmp, _cache_path(self.path))
+            return self.rows
+        finally:
+            self.discard()
+
+    def _finish_cache(self):
+        """把临时的 Arrow 流转写为带源文件 mtime/大小的 Feather 缓存（逐个 batch，不整体读入）。"""
+        if not os.path.exists(self._batches_tmp):
+            return False
+        import pyarrow as pa
+        key = _source_key(self._csv_tmp)  # os.replace 不改变 mtime 和大小
+        with pa.memory_map(self._batches_tmp) as src:
+            reader = pa.ipc.open_stream(src)
+            meta = {b'source': json.dumps(key).encode()}
+            schema = reader.schema.with_metadata(meta)
+            options = pa.ipc.IpcWriteOptions(compression='lz4')
+            with pa.ipc.new_file(self._cache_tmp, schema, options=options) as writer:
+                for batch in reader:
+                    writer.write_batch(batch)
+        return True
+
+
+def _hash_prefix(path, size, block_size=1 << 20):
+    """文件前 size 字节的 sha256 对象（可以继续 update 后面追加的部分）。"""
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while size > 0:
+            block = f.read(min(block_size, size))
+            if not block:
+                break
+            hasher.update(block)
+            size -= len(block)
+    return hasher
+
+
+def _file_probe(path, size):
+    """(前 size 字节的 sha256, 是否以换行结尾)，用来判断文件是否只是在末尾追加了完整的行。"""
+    with open(path, 'rb') as f:
+        f.seek(max(0, size - 1))
+        last = f.read(1) if size else b''
+    return _hash_prefix(path, size).hexdigest(), last == b'\n'
+
+
+class DatasetStore:
+    """进程内共享的数据集：第一次 get() 时加载，之后所有线程共用同一个 DataFrame。
+
+    返回的 DataFrame 由所有请求共享，调用方只能读取、不要原地修改。
+    每次重新加载 version 加 1；数据文件的 mtime/大小变化时 get() 会自动重新加载。
+    上传替换了整个文件时调用 invalidate() 强制下一次整体重新加载；清洗后不要调用，
+    否则只追加了行的情况也会整体重新加载。
+
+    如果文件只是在末尾追加了行（增量清洗），只解析新增部分并拼接到原数据上，
+    派生对象中有 appended() 方法的（如 AggregateCube）也只增量更新。
+    """
+
+    def __init__(self, path=DATA_PATH):
+        self.path = path
+        self.version = 0
+        self._lock = threading.Lock()
+        self._state = None  # (df, 文件 mtime/大小, version)，整体替换保证一致
+        self._derived = {}
+        self._probe = None  # 上次加载时文件内容的 sha256 和是否以换行结尾
+
+    def _stat(self):
+        st = os.stat(self.path)
+        return st.st_mtime_ns, st.st_size
+
+    def snapshot(self):
+        """返回 (DataFrame, version)，两者总是同一次加载的结果。"""
+        key = self._stat()
+        state = self._state
+        if state is not None and state[1] == key:
+            return state[0], state[2]
+        with self._lock:
+            state = self._state
+            if state is None or state[1] != key:
+                df = self._load_appended(state, key)
+                if df is None:
+                    df = load_and_clean(self.path)
+                    self._derived.clear()
+                    self._probe = _file_probe(self.path, key[1])
+                self.version += 1
+                state = self._state = (df, key, self.version)
+            return state[0], state[2]
+
+    def _load_appended(self, state, key):
+        """文件仅在末尾追加了完整的行时，解析新增部分并返回拼接后的数据，否则返回 None。
+
+        追加前的整段内容必须与上次加载时的 sha256 一致（只比较开头/结尾片段的话，
+        中间被原地修改且长度不变时会沿用旧数据，还会把它写进缓存）。
+        """
+        if state is None or self._probe is None:
+            return None
+        old_size, size = state[1][1], key[1]
+        if size <= old_size or not self._probe[1]:
+            return None
+        hasher = _hash_prefix(self.path, old_size)
+        if hasher.hexdigest() != self._probe[0]:
+            return None
+        with open(self.path, 'rb') as f:
+            f.seek(old_size)
+            tail = f.read(size - old_size)
+        if len(tail) != size - old_size or self._stat() != key:
+            return None  # 读取期间文件又变了，整体重新加载
+        hasher.update(tail)
+        old = state[0]
+        new_rows = _parse_csv(io.BytesIO(tail), names=list(old.columns))
+        start = old.index.max() + 1 if len(old) else 0
+        new_rows.index = pd.RangeIndex(start, start + len(new_rows))
+        df = _optimize_dtypes(pd.concat([old, new_rows]))
+        _write_cache(df, self.path, {'mtime_ns': key[0], 'size': size})
+        self._probe = (hasher.hexdigest(), tail.endswith(b'\n'))
+        for name, (version, value) in list(self._derived.items()):
+            if version == state[2] and hasattr(value, 'appended'):
+                self._derived[name] = (version + 1, value.appended(new_rows, df))
+            else:
+                del self._derived[name]
+        return df
+
+    def get(self):
+        return self.snapshot()[0]
+
+    def derived(self, name, builder):
+        """由当前数据派生的对象（如聚合表），每个 version 只构建一次。"""
+        df, version = self.snapshot()
+        hit = self._derived.get(name)
+        if hit is not None and hit[0] == version:
+            return hit[1]
+        value = builder(df)
+        with self._lock:
+            self._derived[name] = (version, value)
+        return value
+
+    def cube(self):
+        return self.derived('cube', AggregateCube)
+
+    def invalidate(self):
+        with self._lock:
+            self._state = None
+            self._derived.clear()
+
+
+class AggregateCube:
+    """按 (学校, 专业, 招生年份) 预先聚合的统计表，绘图时按组直接查询，不再扫描全表。
+
+    - `table`: 行索引 (学校, 专业, 招生年份)，列为 (数值列, 统计量)，统计量为
+      sum/count/mean/median/min/max；跨组的均值由 sum/count 汇总得到，结果与直接 groupby 一致。
+    - `school_median`: 各学校平均分的中位数，降序排列（箱线图“前 N 学校”的排名）。
+    - append() 追加新行时只重新聚合受影响的组和学校。
+    """
+
+    KEYS = ['学校', '专业', '招生年份']
+    STATS = ['sum', 'count', 'mean', 'median', 'min', 'max']
+
+    def __init__(self, df):
+        self.df = df
+        self.value_cols = [c for c in NUMERIC_COLS if c in df.columns and c not in self.KEYS]
+        self.table = self._aggregate(df)
+        self._school_rows = dict(df.groupby('学校', observed=True).indices)
+        self.school_median = self._school_medians(df)
+
+    def _aggregate(self, df):
+        table = df.groupby(self.KEYS, observed=True, dropna=False)[self.value_cols].agg(self.STATS)
+        # 索引层用普通值而不是 category，追加数据后类别变化也能直接拼接
+        table.index = table.index.set_levels([lvl.astype(object) for lvl in table.index.levels])
+        return table.sort_index()
+
+    @staticmethod
+    def _school_medians(df):
+        return df.groupby('学校', observed=True)['平均分'].median().dropna().sort_values(ascending=False)
+
+    def appended(self, new_rows, df):
+        """返回追加 `new_rows` 之后的聚合表（`df` 为追加后的完整数据），只重新聚合受影响的组和学校。
+
+        原对象不变，正在使用它的读者不受影响。
+        """
+        cube = copy.copy(self)
+        cube.df = df
+        touched = pd.MultiIndex.from_frame(new_rows[self.KEYS].astype(object)).unique()
+        keys = pd.MultiIndex.from_frame(df[self.KEYS].astype(object))
+        part = self._aggregate(df[keys.isin(touched)])
+        kept = self.table[~self.table.index.isin(touched)]
+        cube.table = pd.concat([kept, part]).sort_index()
+
+        schools = set(new_rows['学校'].dropna())
+        mask = df['学校'].isin(schools).to_numpy()
+        positions = np.flatnonzero(mask)
+        cube._school_rows = dict(self._school_rows)
+        for school, pos in df[mask].groupby('学校', observed=True).indices.items():
+            cube._school_rows[school] = positions[pos]
+        medians = self.school_median.drop(list(schools), errors='ignore')
+        medians.index = medians.index.astype(object)
+        fresh = self._school_medians(df[mask])
+        fresh.index = fresh.index.astype(object)
+        cube.school_median = pd.concat([medians, fresh]).sort_values(ascending=False, kind='stable')
+        return cube
+
+    def _mean(self, table, metric, by):
+        sums = table[(metric, 'sum')].groupby(level=by, observed=True).sum()
+        counts = table[(metric, 'count')].groupby(level=by, observed=True).sum()
+        return (sums / counts.where(counts > 0)).rename(metric)
+
+    def top_schools(self, top_n):
+        return self.school_median.head(top_n).index
+
+    def rows_for_schools(self, schools):
+        """这些学校的原始行（保持原有行序）。"""
+        pos = [self._school_rows[s] for s in schools if s in self._school_rows]
+        return self.df.iloc[np.sort(np.concatenate(pos))] if pos else self.df.iloc[:0]
+
+    def has_school(self, school):
+        return school in self._school_rows
+
+    def top_majors(self, top_n, metric='平均分', school=None):
+        """按 metric 均值降序的前 top_n 个专业（school 不为 None 时只看该学校）。"""
+        if school is None:
+            means = self._mean(self.table, metric, '专业')
+        else:
+            means = self._mean(self.table.xs(school, level='学校'), metric, '专业')
+        return means.dropna().sort_values(ascending=False).head(top_n).index
+
+    def major_trend(self, majors, metric='平均分', school=None, year_min=None, year_max=None):
+        """各专业 metric 按年份的均值，列为 招生年份/专业/metric，按 (年份, 专业) 排序。"""
+        table = self.table if school is None else self.table.xs(school, level='学校', drop_level=False)
+        idx = table.index
+        mask = idx.get_level_values('专业').isin(majors)
+        if year_min is not None:
+            years = idx.get_level_values('招生年份')
+            mask &= (years >= year_min) & (years <= year_max)
+        trend = self._mean(table[mask], metric, ['招生年份', '专业']).reset_index()
+        return trend.sort_values(['招生年份', '专业']).reset_index(drop=True)
+
+    def school_major_yearly(self, school, major, year_min, year_max):
+        """某学校某专业每年的平均分均值和最低位次中位数。"""
+        try:
+            t = self.table.loc[(school, major)]
+        except KeyError:
+            return pd.DataFrame(columns=['招生年份', '平均分', '最低位次'])
+        t = t[(t.index >= year_min) & (t.index <= year_max)]
+        return pd.DataFrame({
+            '招生年份': t.index.to_numpy(),
+            '平均分': t[('平均分', 'mean')].to_numpy(),
+            '最低位次': t[('最低位次', 'median')].to_numpy(),
+        }).sort_values('招生年份')
+
+
+# 摘要中的分组排名：名称 -> (分组列, 数值列, 统计量)
+RANKINGS = {
+    '学校_平均分_中位数': ('学校', '平均分', 'median'),
+    '专业_平均分_均值': ('专业', '平均分', 'mean'),
+}
+
+
+def summary_stats(df, top_n=10):
     summary = {}
     summary['shape'] = df.shape
     summary['dtypes'] = df.dtypes.to_dict()
     summary['missing'] = df.isna().sum().sort_values(ascending=False)
     summary['describe'] = df[NUMERIC_COLS].describe()
+    summary['rankings'] = {
+        name: df.groupby(by, observed=True)[col].agg(how).dropna().sort_values(ascending=False).head(top_n)
+        for name, (by, col, how) in RANKINGS.items() if by in df.columns and col in df.columns
+    }
+    return summary
+
+
+# 分块统计时每个数值列最多保留的不同取值个数，超过后分位数为近似值（见 _ColumnStats）
+QUANTILE_EXACT_LIMIT = 1 << 16
+
+
+def _lerp(a, b, t):
+    # 与 numpy.quantile 的线性插值写法一致，保证结果逐位相同
+    diff = b - a
+    return b - diff * (1 - t) if t >= 0.5 else a + diff * t
+
+
+def _quantile_from_counts(counts, q):
+    """由按取值排序的计数 Series 计算分位数（线性插值，与 Series.quantile 相同）。"""
+    n = int(counts.sum())
+    if n == 0:
+        return np.nan
+    values = counts.index.to_numpy(dtype='float64')
+    cum = np.cumsum(counts.to_numpy())
+    h = (n - 1) * q
+    lo = int(np.floor(h))
+    a = values[np.searchsorted(cum, lo, side='right')]
+    b = values[np.searchsorted(cum, min(lo + 1, n - 1), side='right')]
+    return _lerp(a, b, h - lo)
+
+
+def _grouped_quantile_from_counts(counts, q):
+    """counts 以 (分组, 取值) 为索引；对每个分组按 _quantile_from_counts 的方法计算分位数。"""
+    counts = counts[counts > 0].sort_index()
+    groups = counts.index.get_level_values(0)
+    values = pd.Series(counts.index.get_level_values(1).to_numpy(dtype='float64'), index=groups)
+    cum = counts.groupby(level=0, sort=False).cumsum().to_numpy()
+    n = counts.groupby(level=0, sort=False).transform('sum').to_numpy()
+    h = (n - 1) * q
+    lo = np.floor(h)
+    a = values[cum > lo].groupby(level=0, sort=False).first()
+    b = values[cum > np.minimum(lo + 1, n - 1)].groupby(level=0, sort=False).first()
+    t = pd.Series(h - lo, index=groups).groupby(level=0, sort=False).first()
+    diff = b - a
+    return (b - diff * (1 - t)).where(t >= 0.5, a + diff * t)
+
+
+class _ColumnStats:
+    """一个数值列的可合并统计量：计数、求和、M2（Chan 合并公式求方差）、最值和取值计数。
+
+    取值计数用于分位数。不同取值超过 QUANTILE_EXACT_LIMIT 时把取值按 `width`
+    （每次翻倍）向下取整合并，此后分位数是近似值，误差不超过 `width`。
+    """
+
+    def __init__(self):
+        self.n = 0
+        self.total = 0.0
+        self.m2 = 0.0
+        self.lo = np.inf
+        self.hi = -np.inf
+        self.integral = True
+        self.counts = pd.Series(dtype='float64')
+        self.width = 0  # 0 表示取值计数是精确的
+
+    def add(self, col):
+        col = col.dropna()
+        if col.empty:
+            return
+        n = len(col)
+        mean = col.mean()
+        m2 = float(((col - mean) ** 2).sum())
+        if self.n:
+            delta = mean - self.total / self.n
+            self.m2 += m2 + delta * delta * self.n * n / (self.n + n)
+        else:
+            self.m2 = m2
+        self.n += n
+        self.total += float(col.sum())
+        self.lo = min(self.lo, col.min())
+        self.hi = max(self.hi, col.max())
+        self.integral = self.integral and bool((col % 1 == 0).all())
+        if self.width:
+            col = np.floor(col / self.width) * self.width
+        self.counts = self.counts.add(col.value_counts(), fill_value=0)
+        while len(self.counts) > QUANTILE_EXACT_LIMIT:
+            self.width = self.width * 2 if self.width else 1
+            bucket = np.floor(self.counts.index.to_numpy(dtype='float64') / self.width) * self.width
+            self.counts = self.counts.groupby(bucket).sum()
+
+    def describe(self):
+        if not self.n:
+            return [0.0] + [np.nan] * 7
+        counts = self.counts.sort_index()
+        std = np.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else np.nan
+        quantiles = [_quantile_from_counts(counts, q) for q in (0.25, 0.5, 0.75)]
+        return [float(self.n), self.total / self.n, std, float(self.lo)] + quantiles + [float(self.hi)]
+
+
+def summary_stats_chunked(path=DATA_PATH, chunksize=100_000, top_n=10):
+    """分块读取 CSV 计算与 summary_stats 相同的摘要，内存占用只和 chunksize 有关。
+
+    每块的统计量（行数、缺失数、各数值列的 _ColumnStats、分组排名用的计数）逐块合并，
+    不会同时持有整个数据集。save_summary_text 的输出与 summary_stats 一致，只有一处例外：
+    某列不同取值超过 QUANTILE_EXACT_LIMIT 时其 25%/50%/75% 分位数是近似值（列名记录在
+    summary['approximate_quantiles']）。分组排名中的中位数同样由取值计数得到，
+    内存与 分组数 × 不同取值数 成正比。
+    """
+    rows = 0
+    columns = None
+    missing = None
+    other_dtypes = {}
+    stats = {c: _ColumnStats() for c in NUMERIC_COLS}
+    group_counts = {name: None for name in RANKINGS}
+    for chunk in pd.read_csv(path, chunksize=chunksize):
+        chunk = _coerce_numeric(chunk)
+        if columns is None:
+            columns = list(chunk.columns)
+            missing = pd.Series(0, index=columns, dtype='int64')
+        rows += len(chunk)
+        missing += chunk.isna().sum()
+        for c in columns:
+            if c not in NUMERIC_COLS and c not in CATEGORY_COLS:
+                other_dtypes.setdefault(c, set()).add(chunk[c].dtype)
+        for c, st in stats.items():
+            if c in chunk.columns:
+                st.add(chunk[c])
+        for name, (by, col, how) in RANKINGS.items():
+            if by not in chunk.columns or col not in chunk.columns:
+                continue
+            if how == 'median':
+                part = chunk.groupby([by, col]).size()
+            else:
+                part = chunk.groupby(by)[col].agg(['sum', 'count'])
+            prev = group_counts[name]
+            group_counts[name] = part if prev is None else prev.add(part, fill_value=0)
+
+    dtypes = {}
+    for c in columns or []:
+        if c in CATEGORY_COLS:
+            dtypes[c] = pd.CategoricalDtype()
+        elif c in NUMERIC_COLS:
+            st = stats[c]
+            if rows == 0:
+                dtypes[c] = np.dtype('float64')
+            else:
+                dtypes[c] = _numeric_dtype(bool(missing[c]), st.integral, st.lo, st.hi)
+        else:
+            found = other_dtypes[c]
+            dtypes[c] = found.pop() if len(found) == 1 else np.dtype('object')
+    # category 的 dtype 打印为 "category"，与 summary_stats 相同
+
+    rankings = {}
+    for name, (by, col, how) in RANKINGS.items():
+        part = group_counts[name]
+        if part is None:
+            continue
+        if how == 'median':
+            agg = _grouped_quantile_from_counts(part, 0.5)
+        else:
+            agg = part['sum'] / part['count'].where(part['count'] > 0)
+        agg.index.name = by
+        rankings[name] = agg.rename(col).dropna().sort_values(ascending=False).head(top_n)
+
+    summary = {}
+    summary['shape'] = (rows, len(columns or []))
+    summary['dtypes'] = dtypes
+    summary['missing'] = missing.sort_values(ascending=False)
+    cols = [c for c in NUMERIC_COLS if c in (columns or [])]
+    summary['describe'] = pd.DataFrame(
+        {c: stats[c].describe() for c in cols},
+        index=['count', 'mean', 'std', 'min', '25%', '50%', '75%', 'max'])
+    summary['rankings'] = rankings
+    summary['approximate_quantiles'] = [c for c in cols if stats[c].width]
     return summary
 
 
@@ -50,6 +745,162 @@ def save_summary_text(summary, out_path):
         f.write(summary['describe'].to_string())
 
 
+# ---- 图表缓存 ----
+# 以 (数据内容哈希, 绘图函数名, 参数) 为键把生成的 PNG 保存在 OUT_DIR/.cache/ 下，
+# 数据和参数都没变时直接复制缓存文件，不再重新绘图。修改绘图代码后请把
+# FIGURE_CACHE_VERSION 加 1，使旧缓存失效。
+FIGURE_CACHE = True
+FIGURE_CACHE_VERSION = 2
+FIGURE_CACHE_MAX_ENTRIES = 200
+FIGURE_CACHE_MAX_BYTES = 200 << 20
+
+_hash_memo = {}  # id(df) -> (weakref(df), 哈希)
+
+
+def dataset_hash(df):
+    """DataFrame 内容（列名、类型和所有值）的哈希，同一个对象只计算一次。"""
+    hit = _hash_memo.get(id(df))
+    if hit is not None and hit[0]() is df:
+        return hit[1]
+    h = hashlib.sha1()
+    h.update(json.dumps([[str(c), str(t)] for c, t in df.dtypes.items()], ensure_ascii=False).encode())
+    h.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    digest = h.hexdigest()
+    for key, (ref, _) in list(_hash_memo.items()):
+        if ref() is None:
+            _hash_memo.pop(key, None)
+    _hash_memo[id(df)] = (weakref.ref(df), digest)
+    return digest
+
+
+def _figure_cache_dir():
+    return os.path.join(OUT_DIR, '.cache')
+
+
+def _evict_figures(cache_dir):
+    """按最近使用时间淘汰缓存，使条目数和总大小不超过上限。
+
+    被淘汰条目复制到 OUT_DIR 的图片如果之后没有被覆盖，也一并删除，避免 figures/ 无限增长。
+    """
+    entries = []
+    for name in os.listdir(cache_dir):
+        if not name.endswith('.json'):
+            continue
+        meta_path = os.path.join(cache_dir, name)
+        png_path = meta_path[:-len('.json')] + '.png'
+        try:
+            used = os.stat(meta_path).st_mtime_ns
+            size = os.path.getsize(png_path)
+        except OSError:
+            continue
+        entries.append((used, size, meta_path, png_path))
+    entries.sort(reverse=True)
+    total = 0
+    for i, (used, size, meta_path, png_path) in enumerate(entries):
+        total += size
+        if i < FIGURE_CACHE_MAX_ENTRIES and total <= FIGURE_CACHE_MAX_BYTES:
+            continue
+        try:
+            with open(meta_path, encoding='utf-8') as f:
+                published = os.path.join(OUT_DIR, json.load(f)['file'])
+            entry_st, out_st = os.stat(png_path), os.stat(published)
+            if (entry_st.st_size, entry_st.st_mtime_ns) == (out_st.st_size, out_st.st_mtime_ns):
+                os.remove(published)
+        except (OSError, ValueError, KeyError):
+            pass
+        for path in (meta_path, png_path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def cached_figure(func):
+    """绘图函数的缓存装饰器。被装饰的函数第一个参数是 df，返回保存的图片路径（没有生成图片时返回 None）。
+
+    命中缓存时把缓存的图片复制到 OUT_DIR 并重放当时打印的内容。
+    """
+    sig = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(df, *args, **kwargs):
+        bound = sig.bind(df, *args, **kwargs)
+        if not FIGURE_CACHE or bound.arguments.get('out') is not None:
+            return func(df, *args, **kwargs)
+        bound.apply_defaults()
+        params = {k: v for k, v in bound.arguments.items() if k not in ('df', 'cube', 'out', 'fmt')}
+        raw = json.dumps([FIGURE_CACHE_VERSION, func.__name__, dataset_hash(df), params],
+                         ensure_ascii=False, sort_keys=True, default=str)
+        key = hashlib.sha1(raw.encode('utf-8')).hexdigest()
+        cache_dir = _figure_cache_dir()
+        entry = os.path.join(cache_dir, key)
+        try:
+            with open(entry + '.json', encoding='utf-8') as f:
+                meta = json.load(f)
+            target = os.path.join(OUT_DIR, meta['file'])
+            src_st = os.stat(entry + '.png')
+            try:
+                out_st = os.stat(target)
+                fresh = (src_st.st_size, src_st.st_mtime_ns) == (out_st.st_size, out_st.st_mtime_ns)
+            except OSError:
+                fresh = False
+            if not fresh:
+                tmp = f'{target}.{os.getpid()}.tmp'
+                shutil.copy2(entry + '.png', tmp)
+                os.replace(tmp, target)
+            os.utime(entry + '.json')  # 记录最近使用时间
+            print(meta['stdout'], end='')
+            metrics.inc('analysis_figure_cache_total', help='图表缓存命中/未命中次数', plot=func.__name__, result='hit')
+            return target
+        except (OSError, ValueError, KeyError):
+            pass
+
+        metrics.inc('analysis_figure_cache_total', help='图表缓存命中/未命中次数', plot=func.__name__, result='miss')
+        buf = io.StringIO()
+        with capture_output(buf):
+            path = func(df, *args, **kwargs)
+        print(buf.getvalue(), end='')
+        if path is None:
+            return None
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp = f'{entry}.{os.getpid()}.tmp'
+            shutil.copy2(path, tmp)
+            os.replace(tmp, entry + '.png')
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump({'file': os.path.basename(path), 'func': func.__name__,
+                           'params': params, 'stdout': buf.getvalue()},
+                          f, ensure_ascii=False, default=str)
+            os.replace(tmp, entry + '.json')
+            _evict_figures(cache_dir)
+        except OSError:
+            pass
+        return path
+
+    return wrapper
+
+
+# pyplot 的当前图表是进程内全局状态，多个线程同时绘图必须串行
+PLOT_LOCK = threading.RLock()
+
+CHART_FUNCS = {
+    'school_major': 'plot_school_major_yearly',
+    'school_majors': 'plot_school_multiple_majors',
+}
+CHART_FORMATS = {'png': 'image/png', 'svg': 'image/svg+xml'}
+
+
+def render_chart(chart, df, fmt='png', cube=None, **params):
+    """在内存中绘制 CHART_FUNCS 中的图表，返回 (图片字节, 打印的提示)；没有数据时图片为 None。"""
+    func = globals()[CHART_FUNCS[chart]]
+    buf = io.BytesIO()
+    log = io.StringIO()
+    with PLOT_LOCK, capture_output(log):
+        result = func(df, cube=cube, out=buf, fmt=fmt, **params)
+    return (buf.getvalue() if result is not None else None), log.getvalue()
+
+
+@cached_figure
 def plot_hist_avg(df):
     plt.figure(figsize=(8, 5))
     sns.histplot(df['平均分'].dropna(), bins=30, kde=True, color='#4C72B0')
@@ -59,26 +910,40 @@ def plot_hist_avg(df):
     plt.tight_layout()
     plt.savefig(p)
     plt.close()
+    return p
 
 
-def plot_box_top_schools(df, top_n=10):
+@cached_figure
+def plot_box_top_schools(df, top_n=10, cube=None):
     if '学校' not in df.columns:
         return
-    order = df.groupby('学校')['平均分'].median().dropna().sort_values(ascending=False).head(top_n).index
+    if cube is not None:
+        order = cube.top_schools(top_n)
+        data = cube.rows_for_schools(order)
+    else:
+        order = df.groupby('学校', observed=True)['平均分'].median().dropna().sort_values(ascending=False).head(top_n).index
+        data = df[df['学校'].isin(order)]
     plt.figure(figsize=(10, 6))
-    sns.boxplot(data=df[df['学校'].isin(order)], x='平均分', y='学校', order=order)
+    sns.boxplot(data=data, x='平均分', y='学校', order=order)
     plt.title(f'按学校的平均分箱线图（前{top_n} 学校）')
     p = os.path.join(OUT_DIR, '学校_平均分_boxplot.png')
     plt.tight_layout()
     plt.savefig(p)
     plt.close()
+    return p
 
 
-def plot_trend_top_majors(df, top_n=6):
+@cached_figure
+def plot_trend_top_majors(df, top_n=6, cube=None):
     if '专业' not in df.columns or '招生年份' not in df.columns:
         return
-    majors = df.groupby('专业')['平均分'].mean().dropna().sort_values(ascending=False).head(top_n).index
-    df_trend = df[df['专业'].isin(majors)].groupby(['招生年份', '专业'])['平均分'].mean().reset_index()
+    if cube is not None:
+        majors = cube.top_majors(top_n)
+        df_trend = cube.major_trend(majors)
+    else:
+        majors = df.groupby('专业', observed=True)['平均分'].mean().dropna().sort_values(ascending=False).head(top_n).index
+        df_trend = df[df['专业'].isin(majors)].groupby(['招生年份', '专业'], observed=True)['平均分'].mean().reset_index()
+    df_trend['专业'] = df_trend['专业'].astype(object)  # 图例只显示选中的专业
     plt.figure(figsize=(10, 6))
     sns.lineplot(data=df_trend, x='招生年份', y='平均分', hue='专业', marker='o')
     plt.title('Top 专业的平均分随年份变化')
@@ -86,6 +951,7 @@ def plot_trend_top_majors(df, top_n=6):
     plt.tight_layout()
     plt.savefig(p)
     plt.close()
+    return p
 
 
 def _sanitize_filename(s: str) -> str:
@@ -97,24 +963,29 @@ def _sanitize_filename(s: str) -> str:
     return s
 
 
-def plot_school_major_yearly(df, school: str, major: str, year_min: int = 2020, year_max: int = 2024):
+@cached_figure
+def plot_school_major_yearly(df, school: str, major: str, year_min: int = 2020, year_max: int = 2024, cube=None, out=None, fmt=None):
     """绘制同一所`school`、同一`major`从 `year_min` 到 `year_max` 的录取分数（平均分）和录取排名（最低位次）折线图。
 
     - 输入: `df` 包含列 `学校`, `专业`, `招生年份`, `平均分`, `最低位次`。
     - 输出: 将图片保存到 `figures/`，文件名格式如：{学校}_{专业}_分数与位次_趋势.png
+    - 传入 `cube`（AggregateCube）时直接读取预聚合结果，不扫描 `df`。
+    - 传入 `out`（文件对象）时把 `fmt` 格式的图片写入 `out`，不写 `figures/`。
     """
     cols_needed = ['学校', '专业', '招生年份', '平均分', '最低位次']
     for c in cols_needed:
         if c not in df.columns:
             raise ValueError(f"缺少列: {c}")
 
-    sub = df[(df['学校'] == school) & (df['专业'] == major) & (df['招生年份'].between(year_min, year_max))]
-    if sub.empty:
+    if cube is not None:
+        agg = cube.school_major_yearly(school, major, year_min, year_max)
+    else:
+        sub = df[(df['学校'] == school) & (df['专业'] == major) & (df['招生年份'].between(year_min, year_max))]
+        agg = sub.groupby('招生年份').agg({'平均分': 'mean', '最低位次': 'median'}).reset_index().sort_values('招生年份')
+    if agg.empty:
         print(f'未找到 {school} - {major} 在 {year_min}-{year_max} 的记录')
         return
 
-    agg = sub.groupby('招生年份').agg({'平均分': 'mean', '最低位次': 'median'}).reset_index().sort_values('招生年份')
-
     plt.figure(figsize=(10, 6))
     ax1 = plt.gca()
     ax2 = ax1.twinx()
@@ -135,22 +1006,41 @@ def plot_school_major_yearly(df, school: str, major: str, year_min: int = 2020,
     ax1.legend(lines_1 + lines_2, labels_1 + labels_2, loc='best')
 
     fname = _sanitize_filename(f"{school}_{major}_分数与位次_趋势.png")
-    p = os.path.join(OUT_DIR, fname)
-    plt.tight_layout()
-    plt.savefig(p)
-    plt.close()
-    print('已保存：', p)
+    return _save_figure(os.path.join(OUT_DIR, fname), out, fmt)
 
 
-def plot_school_multiple_majors(df, school: str, majors: list = None, metric: str = '平均分', year_min: int = 2020, year_max: int = 2024, top_n: int = 6):
+@cached_figure
+def plot_school_multiple_majors(df, school: str, majors: list = None, metric: str = '平均分', year_min: int = 2020, year_max: int = 2024, top_n: int = 6, cube=None, out=None, fmt=None):
     """绘制同一所学校中若干专业在指定年份范围内的 `metric` 折线图。
 
     - 如果 `majors` 为 None，会选择该学校中按 `metric` 平均值排序的前 `top_n` 个专业。
     - `metric` 默认是 `平均分`，也可以是 `最低分` 等数值列。
+    - 传入 `cube`（AggregateCube）时直接读取预聚合结果，不扫描 `df`。
+    - 传入 `out`（文件对象）时把 `fmt` 格式的图片写入 `out`，不写 `figures/`。
     """
     if '学校' not in df.columns or '专业' not in df.columns or '招生年份' not in df.columns:
         raise ValueError('数据缺少必须的列：学校、专业或招生年份')
 
+    if cube is not None and metric in cube.value_cols:
+        if not cube.has_school(school):
+            print(f'未找到学校: {school}')
+            return
+        if majors is None:
+            majors = cube.top_majors(top_n, metric, school=school).tolist()
+        trend = cube.major_trend(majors, metric, school=school, year_min=year_min, year_max=year_max)
+        trend = trend.dropna(subset=[metric])
+        if trend.empty:
+            print('未找到符合条件的数据')
+            return
+    else:
+        trend = _school_trend(df, school, majors, metric, year_min, year_max, top_n)
+        if trend is None:
+            return
+    trend['专业'] = trend['专业'].astype(object)  # 图例只显示选中的专业
+    return _draw_school_trend(trend, school, metric, year_min, year_max, out, fmt)
+
+
+def _school_trend(df, school, majors, metric, year_min, year_max, top_n):
     school_df = df[df['学校'] == school].copy()
     if school_df.empty:
         print(f'未找到学校: {school}')
@@ -159,15 +1049,17 @@ def plot_school_multiple_majors(df, school: str, majors: list = None, metric: st
     if majors is None:
         if metric not in school_df.columns:
             raise ValueError(f'度量列 {metric} 不存在')
-        majors = school_df.groupby('专业')[metric].mean().dropna().sort_values(ascending=False).head(top_n).index.tolist()
+        majors = school_df.groupby('专业', observed=True)[metric].mean().dropna().sort_values(ascending=False).head(top_n).index.tolist()
 
     sub = school_df[school_df['专业'].isin(majors) & school_df['招生年份'].between(year_min, year_max)]
     if sub.empty:
         print('未找到符合条件的数据')
         return
 
-    trend = sub.groupby(['招生年份', '专业'])[metric].mean().reset_index()
+    return sub.groupby(['招生年份', '专业'], observed=True)[metric].mean().reset_index()
 
+
+def _draw_school_trend(trend, school, metric, year_min, year_max, out=None, fmt=None):
     plt.figure(figsize=(11, 6))
     sns.lineplot(data=trend, x='招生年份', y=metric, hue='专业', marker='o')
     plt.title(f"{school} 不同专业 {metric} 趋势 ({year_min}-{year_max})")
@@ -175,56 +1067,204 @@ def plot_school_multiple_majors(df, school: str, majors: list = None, metric: st
     plt.ylabel(metric)
 
     fname = _sanitize_filename(f"{school}_不同专业_{metric}_趋势.png")
-    p = os.path.join(OUT_DIR, fname)
+    return _save_figure(os.path.join(OUT_DIR, fname), out, fmt)
+
+
+def _save_figure(p, out=None, fmt=None):
+    """保存当前图表：默认写入文件 p 并打印路径；给出 out 时写入 out（内存缓冲区等）。"""
     plt.tight_layout()
+    if out is not None:
+        plt.savefig(out, format=fmt)
+        plt.close()
+        return out
     plt.savefig(p)
     plt.close()
     print('已保存：', p)
+    return p
+
+
 
+def score_rank_density(df, bins=60):
+    """按年份统计 (最低位次, 最低分) 的二维直方图，使用全部数据。
+
+    返回 (years, H, xedges, yedges)，H 的形状为 (年份数, bins, bins)，各年份使用相同的分箱。
+    """
+    sub = df[['最低分', '最低位次', '招生年份']].dropna()
+    x = sub['最低位次'].to_numpy(dtype='float64')
+    y = sub['最低分'].to_numpy(dtype='float64')
+    year = sub['招生年份'].to_numpy(dtype='float64')
+    years = np.unique(year)
+    xedges = np.histogram_bin_edges(x, bins=bins)
+    yedges = np.histogram_bin_edges(y, bins=bins)
+    year_edges = np.append(years, years[-1] + 1) - 0.5
+    H, _ = np.histogramdd((year, x, y), bins=(year_edges, xedges, yedges))
+    return years.astype(int), H, xedges, yedges
 
 
-def plot_score_vs_rank(df, sample_n=3000):
+@cached_figure
+def plot_score_vs_rank(df, sample_n=3000, mode='density', bins=60):
+    """最低分与最低位次的关系图。
+
+    - mode='density'（默认）: 全部数据按年份分箱计数，每年一张小图（颜色为记录数，对数刻度），
+      绘图耗时与数据行数基本无关。
+    - mode='sample': 旧的散点图，随机抽取 sample_n 个点，颜色表示招生年份。
+    """
     if '最低分' not in df.columns or '最低位次' not in df.columns:
         return
-    sub = df[['最低分', '最低位次', '招生年份']].dropna()
-    if len(sub) > sample_n:
-        sub = sub.sample(sample_n, random_state=42)
-    plt.figure(figsize=(8, 6))
-    sc = plt.scatter(sub['最低位次'], sub['最低分'], c=sub['招生年份'], cmap='viridis', alpha=0.7)
-    plt.xlabel('最低位次')
-    plt.ylabel('最低分')
-    plt.title('最低分 vs 最低位次（采样）')
-    plt.colorbar(sc, label='招生年份')
+    if mode == 'sample':
+        sub = df[['最低分', '最低位次', '招生年份']].dropna()
+        if len(sub) > sample_n:
+            sub = sub.sample(sample_n, random_state=42)
+        plt.figure(figsize=(8, 6))
+        sc = plt.scatter(sub['最低位次'], sub['最低分'], c=sub['招生年份'], cmap='viridis', alpha=0.7)
+        plt.xlabel('最低位次')
+        plt.ylabel('最低分')
+        plt.title('最低分 vs 最低位次（采样）')
+        plt.colorbar(sc, label='招生年份')
+    else:
+        if df[['最低分', '最低位次', '招生年份']].dropna().empty:
+            return
+        years, H, xedges, yedges = score_rank_density(df, bins)
+        ncols = int(np.ceil(np.sqrt(len(years))))
+        nrows = -(-len(years) // ncols)
+        fig, axes = plt.subplots(nrows, ncols, figsize=(4 * ncols + 1.5, 3.4 * nrows + 0.6),
+                                 sharex=True, sharey=True, squeeze=False)
+        # 固定边距，不用 tight/constrained layout（子图多时布局计算比绘图本身还慢）
+        fig.subplots_adjust(left=0.09, right=0.86, bottom=0.1, top=0.9, wspace=0.08, hspace=0.22)
+        norm = matplotlib.colors.LogNorm(vmin=1, vmax=max(H.max(), 1))
+        for i, (ax, year, counts) in enumerate(zip(axes.flat, years, H)):
+            mesh = ax.pcolormesh(xedges, yedges, np.ma.masked_equal(counts.T, 0), cmap='viridis', norm=norm)
+            ax.set_title(f'{year} 年')
+            ax.grid(False)
+            ax.xaxis.set_major_locator(matplotlib.ticker.MaxNLocator(4))
+            if i + ncols >= len(years):  # 每列最下面一张图显示横轴
+                ax.set_xlabel('最低位次')
+                ax.xaxis.set_tick_params(labelbottom=True)
+            if i % ncols == 0:
+                ax.set_ylabel('最低分')
+        for ax in axes.flat[len(years):]:
+            ax.set_visible(False)
+        fig.suptitle('最低分 vs 最低位次（按年份密度）')
+        fig.colorbar(mesh, cax=fig.add_axes([0.89, 0.15, 0.02, 0.7]), label='记录数')
     p = os.path.join(OUT_DIR, '最低分_vs_最低位次.png')
-    plt.tight_layout()
+    if mode == 'sample':
+        plt.tight_layout()
     plt.savefig(p)
     plt.close()
+    return p
+
+
+# main() 生成的图表：(开始前打印的提示, 绘图函数名, 参数)。各项互不依赖，可以并行绘制。
+FIGURE_JOBS = [
+    ('绘图：平均分分布', 'plot_hist_avg', {}),
+    ('绘图：学校箱线图', 'plot_box_top_schools', {'cube': True}),
+    ('绘图：专业平均分趋势', 'plot_trend_top_majors', {'cube': True}),
+    ('绘图：最低分 vs 最低位次', 'plot_score_vs_rank', {}),
+    (None, 'plot_school_major_yearly', {'school': '四川大学', 'major': '临床医学', 'year_min': 2020, 'year_max': 2024, 'cube': True}),
+    (None, 'plot_school_multiple_majors', {'school': '四川大学', 'majors': None, 'metric': '平均分', 'year_min': 2020, 'year_max': 2024, 'top_n': 10, 'cube': True}),
+]
+
+_worker_cube = None
 
 
-def main():
+def _set_fonts():
     matplotlib.rcParams['font.sans-serif'] = ['Microsoft YaHei']
     matplotlib.rcParams['axes.unicode_minus'] = False
+
+
+def _init_render_worker(cube, out_dir):
+    """进程池初始化：每个进程只接收一次数据（随 initargs 序列化），之后的任务只传函数名和参数。"""
+    global _worker_cube, OUT_DIR
+    matplotlib.use('Agg')
+    _set_fonts()
+    _worker_cube = cube
+    OUT_DIR = out_dir
+
+
+def _render_figure(cube, name, kwargs):
+    if kwargs.get('cube'):
+        kwargs = dict(kwargs, cube=cube)
+    with metrics.timed('analysis_plot_seconds', help='每张图的绘制耗时（含缓存命中）', plot=name):
+        globals()[name](cube.df, **kwargs)
+    metrics.set_max('analysis_peak_rss_bytes', metrics.peak_rss_bytes(), help='各阶段结束时进程的峰值内存', stage=name)
+
+
+def _render_in_worker(name, kwargs):
+    """在子进程中绘制一张图，返回 (期间打印的内容, 指标快照)，由主进程按顺序输出并合并指标。"""
+    metrics.reset()  # 工作进程会被复用，每个任务只上报自己的指标
+    buf = io.StringIO()
+    with capture_output(buf):
+        _render_figure(_worker_cube, name, kwargs)
+    return buf.getvalue(), metrics.snapshot()
+
+
+def render_figures(cube, workers=1):
+    """绘制 FIGURE_JOBS 中的全部图表。
+
+    workers > 1 时使用进程池（Agg 后端）并行绘制；输出文件和打印内容（按任务顺序）与顺序执行一致。
+    工作进程总是用 spawn 启动：app.py 在多线程的服务器里调用这里，fork 出的子进程可能继承
+    其他线程持有的锁（metrics、output_capture 等）而死锁。
+    """
+    workers = min(workers, len(FIGURE_JOBS))
+    if workers <= 1:
+        with PLOT_LOCK:
+            for label, name, kwargs in FIGURE_JOBS:
+                if label:
+                    print(label)
+                _render_figure(cube, name, kwargs)
+        return
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=_init_render_worker, initargs=(cube, OUT_DIR)) as pool:
+        futures = [pool.submit(_render_in_worker, name, kwargs) for _, name, kwargs in FIGURE_JOBS]
+        for (label, _, _), fut in zip(FIGURE_JOBS, futures):
+            if label:
+                print(label)
+            text, snap = fut.result()
+            print(text, end='')
+            metrics.merge(snap)
+
+
+def main(workers=1):
+    base = metrics.snapshot() if metrics.ENABLED else None
+    _set_fonts()
     print('加载数据...')
-    df = load_and_clean()
-    print('样本量:', len(df))
+    with metrics.timed('analysis_stage_seconds', help='全部分析各阶段的耗时', stage='load'):
+        df = load_and_clean()
+        print('样本量:', len(df))
+        cube = AggregateCube(df)
+    metrics.set_max('analysis_peak_rss_bytes', metrics.peak_rss_bytes(), stage='load')
 
     print('计算统计摘要...')
-    summary = summary_stats(df)
-    save_summary_text(summary, os.path.join(OUT_DIR, 'analysis_summary.txt'))
+    with metrics.timed('analysis_stage_seconds', stage='summary'):
+        summary = summary_stats(df)
+        save_summary_text(summary, os.path.join(OUT_DIR, 'analysis_summary.txt'))
     print('摘要已写入:', os.path.join(OUT_DIR, 'analysis_summary.txt'))
 
-    print('绘图：平均分分布')
-    plot_hist_avg(df)
-    print('绘图：学校箱线图')
-    plot_box_top_schools(df)
-    print('绘图：专业平均分趋势')
-    plot_trend_top_majors(df)
-    print('绘图：最低分 vs 最低位次')
-    plot_score_vs_rank(df)
-    plot_school_major_yearly(df, school='四川大学', major='临床医学', year_min=2020, year_max=2024)
-    plot_school_multiple_majors(df, school='四川大学', majors=None, metric='平均分', year_min=2020, year_max=2024, top_n=10)
+    with metrics.timed('analysis_stage_seconds', stage='render'):
+        render_figures(cube, workers)
     print('所有图表已保存到:', OUT_DIR)
+    print(metrics.report(base), end='')
+
+
+def summary_main(chunksize):
+    """只生成统计摘要，分块读取数据（不绘图），用于内存放不下的大数据集。"""
+    print('分块计算统计摘要...')
+    summary = summary_stats_chunked(DATA_PATH, chunksize=chunksize)
+    out_path = os.path.join(OUT_DIR, 'analysis_summary.txt')
+    save_summary_text(summary, out_path)
+    print('样本量:', summary['shape'][0])
+    if summary['approximate_quantiles']:
+        print('以下列的分位数为近似值:', ', '.join(summary['approximate_quantiles']))
+    print('摘要已写入:', out_path)
 
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description='生成统计摘要和图表')
+    parser.add_argument('--workers', type=int, default=1, help='并行绘图的进程数（默认 1，顺序绘制）')
+    parser.add_argument('--chunked', action='store_true', help='分块读取数据，只生成统计摘要（不绘图）')
+    parser.add_argument('--chunksize', type=int, default=100_000, help='--chunked 时每块的行数')
+    args = parser.parse_args()
+    if args.chunked:
+        summary_main(args.chunksize)
+    else:
+        main(workers=args.workers)
@@ -1,202 +1,321 @@
 # -*- coding: utf-8 -*-
-from flask import Flask, render_template, request, redirect, url_for, send_from_directory, flash, Response, stream_with_context
+from flask import Flask, render_template, request, redirect, url_for, send_from_directory, flash, Response, stream_with_context, jsonify, abort, g
 import os
-from werkzeug.utils import secure_filename
+from werkzeug.formparser import FormDataParser
+from werkzeug.security import safe_join
 import subprocess
+import tempfile
 import io
 import sys
 from pathlib import Path
 import traceback
 import time
+import json
+import hashlib
+import threading
+from collections import OrderedDict
 
 PROJECT_DIR = os.path.dirname(__file__)
 DATA_FILENAME = '招生数据_clean.csv'
 DATA_PATH = os.path.join(PROJECT_DIR, DATA_FILENAME)
+RAW_PATH = os.path.join(PROJECT_DIR, '招生数据.csv')
+LOG_PATH = os.path.join(PROJECT_DIR, 'last_action.log')
 OUT_DIR = os.path.join(PROJECT_DIR, 'figures')
 UPLOAD_FOLDER = PROJECT_DIR
 ALLOWED_EXTENSIONS = {'csv'}
+# /run_all 并行绘图的进程数。默认 1（顺序绘制）：每个 spawn 进程都要重新导入 pandas/matplotlib
+# 并接收整个数据集，图表少且快时反而更慢，数据量大时再调大
+PLOT_WORKERS = max(1, int(os.environ.get('APP_PLOT_WORKERS', '1') or 1))
 
 app = Flask(__name__)
 app.secret_key = 'dev-secret'
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
-# 延迟导入分析模块（确保 Flask 启动时使用本地文件）
-import analysis
 import Clean_Data
+import metrics
+from jobs import JobManager
+from log_tail import LogTailer
+from output_capture import capture as capture_output
+
+# 所有 /stream_log 连接共享一个 tailer，只推送 last_action.log 新追加的内容
+LOG_TAILER = LogTailer(LOG_PATH)
+# 爬取/清洗/全部分析在后台线程池中执行，日志同时写入 job_logs/<任务ID>.log 和 last_action.log
+JOBS = JobManager(os.path.join(PROJECT_DIR, 'job_logs'), mirror_path=LOG_PATH, max_workers=2,
+                  on_write=LOG_TAILER.notify)
+
+# 分析模块依赖 pandas/matplotlib/seaborn，导入较慢：启动时不导入，
+# 第一次需要时（或由后台预热线程）再导入，/、/upload、/stream_log 等页面不受影响。
+_analysis = None
+_dataset = None  # 所有绘图请求共用的数据集，只在数据文件变化时重新加载
+_analysis_lock = threading.Lock()
+
+
+def load_analysis():
+    """返回 analysis 模块，第一次调用时导入并创建共享数据集。"""
+    global _analysis, _dataset
+    if _analysis is None:
+        with _analysis_lock:
+            if _analysis is None:
+                import analysis
+                _dataset = analysis.DatasetStore(DATA_PATH)
+                _analysis = analysis
+    return _analysis
+
+
+def dataset():
+    load_analysis()
+    return _dataset
+
+
+def invalidate_dataset():
+    # 还没导入分析模块时数据集也不存在，无需处理
+    if _dataset is not None:
+        _dataset.invalidate()
+
+
+def _warm_up():
+    try:
+        load_analysis()
+        if os.path.exists(DATA_PATH):
+            dataset().cube()
+    except Exception:
+        traceback.print_exc()
+
+
+def start_warm_up():
+    """在后台线程中导入分析模块并加载数据，让第一次绘图请求不必等待。设置 APP_WARMUP=0 可关闭。"""
+    if os.environ.get('APP_WARMUP', '1') != '0':
+        threading.Thread(target=_warm_up, name='analysis-warmup', daemon=True).start()
+
+
+if metrics.ENABLED:
+    @app.before_request
+    def _start_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def _record_latency(response):
+        started = g.get('request_started')
+        if started is not None:
+            metrics.observe('http_request_seconds', time.perf_counter() - started, help='各路由的响应耗时',
+                            endpoint=request.endpoint or 'unknown', method=request.method,
+                            status=str(response.status_code))
+        return response
+
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus 文本格式的指标：本进程的，加上子进程（爬取、清洗脚本）留下的快照。
+
+    需要设置环境变量 APP_METRICS=1 启动，否则只返回一行说明。
+    """
+    if not metrics.ENABLED:
+        text = '# metrics disabled, start with APP_METRICS=1\n'
+    else:
+        text = metrics.render_prometheus(metrics.load_snapshots())
+    return Response(text, mimetype='text/plain; version=0.0.4')
 
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
+# 文件内容哈希，按 (mtime, 大小) 缓存：路径 -> (mtime_ns, size, sha1)
+_FILE_HASHES = {}
+# figures 目录下的图片列表，按目录 mtime 缓存：(mtime_ns, [文件名])
+_FIGURE_LISTING = (None, [])
+_figure_cache_lock = threading.Lock()
+
+
+def _file_hash(path):
+    """文件内容的 sha1；文件的 mtime 和大小不变时直接用缓存，不重新读取。"""
+    st = os.stat(path)
+    hit = _FILE_HASHES.get(path)
+    if hit is not None and hit[:2] == (st.st_mtime_ns, st.st_size):
+        return hit[2]
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    digest = h.hexdigest()
+    with _figure_cache_lock:
+        _FILE_HASHES[path] = (st.st_mtime_ns, st.st_size, digest)
+    return digest
+
+
+def figure_versions():
+    """figures 目录下的图片及其内容哈希 [(文件名, 哈希前 16 位)]。
+
+    文件名列表在目录 mtime 不变时直接用缓存；每个文件仍 stat 一次，图片被原地重写时哈希随之更新。
+    """
+    global _FIGURE_LISTING
+    try:
+        mtime = os.stat(OUT_DIR).st_mtime_ns
+    except OSError:
+        return []
+    if _FIGURE_LISTING[0] != mtime:
+        names = sorted(fn for fn in os.listdir(OUT_DIR) if fn.lower().endswith(('.png', '.jpg', '.jpeg')))
+        with _figure_cache_lock:
+            _FIGURE_LISTING = (mtime, names)
+            live = {os.path.join(OUT_DIR, fn) for fn in names}
+            for path in [p for p in _FILE_HASHES if p not in live]:
+                del _FILE_HASHES[path]
+    out = []
+    for fn in _FIGURE_LISTING[1]:
+        try:
+            out.append((fn, _file_hash(os.path.join(OUT_DIR, fn))[:16]))
+        except OSError:
+            pass  # 刚被删除
+    return out
+
+
 @app.route('/')
 def index():
-    # 列出 figures 目录下的图片
-    imgs = []
-    if os.path.isdir(OUT_DIR):
-        for fn in sorted(os.listdir(OUT_DIR)):
-            if fn.lower().endswith(('.png', '.jpg', '.jpeg')):
-                imgs.append(fn)
-    # 读取最近一次操作日志（如果存在）
-    log_path = os.path.join(PROJECT_DIR, 'last_action.log')
-    log_text = ''
-    if os.path.exists(log_path):
-        try:
-            with open(log_path, 'r', encoding='utf-8') as f:
-                log_text = f.read()
-        except Exception:
-            log_text = '无法读取日志文件'
-    return render_template('index.html', images=imgs, log_text=log_text)
+    # 列出 figures 目录下的图片；链接带内容哈希 ?v=，内容不变时浏览器直接用缓存
+    imgs = figure_versions()
+    # 最近一次操作日志（由 LOG_TAILER 缓存），log_pos 让页面上的 SSE 从这里接着读
+    log_pos, log_text = LOG_TAILER.snapshot()
+    html = render_template('index.html', images=imgs, log_text=log_text, log_pos=log_pos, jobs=JOBS.list()[:10])
+    resp = Response(html, mimetype='text/html')
+    resp.set_etag(hashlib.sha1(html.encode('utf-8')).hexdigest())
+    resp.headers['Cache-Control'] = 'no-cache'
+    return resp.make_conditional(request)
 
 
 @app.route('/upload', methods=['GET', 'POST'])
 def upload():
     if request.method == 'POST':
-        if 'file' not in request.files:
-            flash('未选择文件')
-            return redirect(request.url)
-        file = request.files['file']
-        if file.filename == '':
-            flash('未选择文件')
-            return redirect(request.url)
-        if file and allowed_file(file.filename):
-            filename = secure_filename(file.filename)
-            save_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(save_path)
-            # 覆盖项目中的数据文件
-            try:
-                os.replace(save_path, DATA_PATH)
-            except Exception:
-                # 在某些系统中 os.replace 可能权限受限，尝试复制
-                import shutil
-                shutil.copy(save_path, DATA_PATH)
-                os.remove(save_path)
-            flash('上传并替换数据成功')
-            return redirect(url_for('index'))
-    return render_template('upload.html')
+        # 上传内容边接收边校验，直接写入临时 CSV 和 Feather 缓存，不先整体落盘再复制
+        analysis = load_analysis()
+        ingests = []
 
+        def stream_factory(total_content_length, content_type, filename, content_length=None):
+            if filename and allowed_file(filename):
+                ingests.append(analysis.CsvIngest(DATA_PATH))
+                return ingests[-1]
+            return tempfile.TemporaryFile()
 
-@app.route('/run_all', methods=['POST'])
-def run_all():
-    # 运行 analysis.main 来生成所有图表和摘要，并捕获输出到日志
-    log_path = os.path.join(PROJECT_DIR, 'last_action.log')
-    try:
-        buf_out = io.StringIO()
-        buf_err = io.StringIO()
-        old_stdout = sys.stdout
-        old_stderr = sys.stderr
-        sys.stdout = buf_out
-        sys.stderr = buf_err
         try:
-            analysis.main()
+            parser = FormDataParser(stream_factory=stream_factory,
+                                    max_form_memory_size=app.config.get('MAX_FORM_MEMORY_SIZE'))
+            _, _, files = parser.parse(request.stream, request.mimetype, request.content_length,
+                                       request.mimetype_params)
+            file = files.get('file')
+            if file is None or file.filename == '':
+                flash('未选择文件')
+                return redirect(request.url)
+            if isinstance(file.stream, analysis.CsvIngest):
+                try:
+                    rows = file.stream.commit()
+                except analysis.UploadError as e:
+                    flash(f'上传失败，数据未替换：{e}')
+                    return redirect(request.url)
+                invalidate_dataset()
+                flash(f'上传并替换数据成功（{rows} 行）')
+                return redirect(url_for('index'))
         finally:
-            sys.stdout = old_stdout
-            sys.stderr = old_stderr
+            for ingest in ingests:
+                ingest.discard()
+    return render_template('upload.html')
 
-        out = buf_out.getvalue()
-        err = buf_err.getvalue()
-        with open(log_path, 'w', encoding='utf-8') as f:
-            f.write('=== ANALYSIS OUTPUT ===\n')
-            f.write(out or '')
-            if err:
-                f.write('\n=== ANALYSIS ERR ===\n')
-                f.write(err)
-
-        flash('全部分析已完成，图表已生成，日志已写入 last_action.log')
-    except Exception as e:
-        # 捕获异常并写入日志
-        tb = traceback.format_exc()
-        with open(log_path, 'w', encoding='utf-8') as f:
-            f.write('=== ANALYSIS EXCEPTION ===\n')
-            f.write(tb)
-        flash('运行分析出错，详情见 last_action.log')
+
+def _stream_process(args, log, title):
+    """运行子进程，把输出逐行写入任务日志（实时日志能立刻看到）；退出码非 0 时抛出 RuntimeError，任务记为失败。"""
+    log.write(f'=== {title} (实时) ===\n')
+    proc = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    try:
+        for line in iter(proc.stdout.readline, ''):
+            log.write(line)
+    except Exception:
+        # 在读取过程中如果出错，记录并继续等待进程结束
+        log.write(f'\n=== {title} READ ERROR ===\n')
+        log.write(traceback.format_exc())
+    ret = proc.wait()
+    log.write(f'\n=== {title} EXIT CODE: {ret} ===\n')
+    if ret != 0:
+        raise RuntimeError(f'{title} 退出码 {ret}')
+
+
+def _run_all_job(log):
+    # 运行 analysis.main 来生成所有图表和摘要；输出由任务按线程捕获
+    analysis = load_analysis()
+    log.write('=== ANALYSIS OUTPUT ===\n')
+    analysis.main(workers=PLOT_WORKERS)
+    return '全部分析已完成，图表已生成'
+
+
+def _crawl_job(log):
+    # --incremental: 历史年份直接读响应缓存，只请求缺失页和最近一年的数据
+    _stream_process([sys.executable, os.path.join(PROJECT_DIR, 'Data_request.py'), '--incremental'], log, 'CRAWL OUTPUT')
+    # 爬取成功（失败时上面已抛出异常，不会清洗旧数据）并生成了招生数据 CSV 时，自动以子进程运行清洗脚本
+    if not os.path.exists(RAW_PATH):
+        return '爬取完成，但未生成招生数据 CSV'
+    log.write('\n')
+    # 爬取会按 学校 x 年份 的顺序重写整个文件，前缀通常会变，这里的 --incremental 多半退化为全量清洗
+    _stream_process([sys.executable, os.path.join(PROJECT_DIR, 'Clean_Data.py'), '--incremental'], log, 'CLEAN OUTPUT (自动)')
+    # 不调用 invalidate_dataset()：数据集按文件 mtime/大小发现变化，只追加了行时增量更新
+    return '爬取并清洗完成'
+
+
+def _clean_job(log):
+    log.write('=== CLEAN OUTPUT ===\n')
+    base = metrics.snapshot() if metrics.ENABLED else None
+    # 只清洗新追加的行；原始数据前缀变化时自动全量重建
+    Clean_Data.clean_file(Path(RAW_PATH), Path(DATA_PATH), incremental=True)
+    log.write(metrics.report(base))
+    # 同上，由 DatasetStore 自行判断是增量追加还是整体重新加载
+    return '清洗完成'
+
+
+# kind -> (任务函数, 用到的资源, 提示名称)。资源相同的任务依次执行。
+JOB_TYPES = {
+    'run_all': (_run_all_job, ('clean', 'figures'), '全部分析'),
+    'crawl': (_crawl_job, ('raw', 'clean'), '爬取'),
+    'clean': (_clean_job, ('raw', 'clean'), '清洗'),
+}
+
+
+def _submit(kind):
+    func, resources, title = JOB_TYPES[kind]
+    job, created = JOBS.submit(kind, func, resources=resources)
+    if request.accept_mimetypes.best == 'application/json':
+        return jsonify(job.to_dict()), 202
+    if created:
+        flash(f'已提交{title}任务 {job.id}，进度见下方实时日志')
+    else:
+        flash(f'{title}任务 {job.id} 已在排队，不重复提交')
     return redirect(url_for('index'))
 
 
+@app.route('/run_all', methods=['POST'])
+def run_all():
+    return _submit('run_all')
+
+
 @app.route('/crawl_run', methods=['POST'])
 def crawl_run():
-    """通过运行 Data_request.py 来执行爬取，并捕获命令行输出到日志文件。"""
-    log_path = os.path.join(PROJECT_DIR, 'last_action.log')
-    try:
-        # 使用 Popen 实时读取 stdout/stderr 并写入日志，保证 SSE 能立刻推送
-        with open(log_path, 'w', encoding='utf-8') as logf:
-            logf.write('=== CRAWL OUTPUT (实时) ===\n')
-            logf.flush()
-
-            proc = subprocess.Popen([sys.executable, os.path.join(PROJECT_DIR, 'Data_request.py')], stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
-            # 逐行读取并写入日志
-            try:
-                for line in iter(proc.stdout.readline, ''):
-                    if line == '' and proc.poll() is not None:
-                        break
-                    # 写入并立即刷新，SSE 会读到最新文件内容
-                    logf.write(line)
-                    logf.flush()
-            except Exception:
-                # 在读取过程中如果出错，记录并继续等待进程结束
-                logf.write('\n=== CRAWL READ ERROR ===\n')
-                logf.write(traceback.format_exc())
-                logf.flush()
-
-            ret = proc.wait()
-            logf.write(f'\n=== CRAWL EXIT CODE: {ret} ===\n')
-            logf.flush()
-
-        # 如果爬取生成了招生数据 CSV，自动以子进程运行清洗脚本并追加日志（同样实时写入）
-        inp = os.path.join(PROJECT_DIR, '招生数据.csv')
-        outp = os.path.join(PROJECT_DIR, '招生数据_clean.csv')
-        if os.path.exists(inp):
-            with open(log_path, 'a', encoding='utf-8') as logf:
-                logf.write('\n=== CLEAN OUTPUT (实时, 自动) ===\n')
-                logf.flush()
-                proc2 = subprocess.Popen([sys.executable, os.path.join(PROJECT_DIR, 'Clean_Data.py')], stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
-                try:
-                    for line in iter(proc2.stdout.readline, ''):
-                        if line == '' and proc2.poll() is not None:
-                            break
-                        logf.write(line)
-                        logf.flush()
-                except Exception:
-                    logf.write('\n=== CLEAN READ ERROR ===\n')
-                    logf.write(traceback.format_exc())
-                    logf.flush()
-                ret2 = proc2.wait()
-                logf.write(f'\n=== CLEAN EXIT CODE: {ret2} ===\n')
-                logf.flush()
-            flash('爬取并清洗完成，日志已写入 last_action.log')
-        else:
-            flash('爬取完成，但未生成招生数据 CSV，详情见 last_action.log')
-    except Exception as e:
-        # 将异常写入日志并反馈
-        with open(log_path, 'a', encoding='utf-8') as logf:
-            logf.write('\n=== CRAWL EXCEPTION ===\n')
-            logf.write(traceback.format_exc())
-        flash('爬取出错: ' + str(e))
-    return redirect(url_for('index'))
+    """后台运行 Data_request.py 爬取，完成后自动清洗。"""
+    return _submit('crawl')
 
 
 @app.route('/clean_run', methods=['POST'])
 def clean_run():
-    """调用 Clean_Data.clean_file 对 `招生数据.csv` 进行清洗，输出到 `招生数据_clean.csv` 并保存日志。"""
-    log_path = os.path.join(PROJECT_DIR, 'last_action.log')
-    inp = os.path.join(PROJECT_DIR, '招生数据.csv')
-    outp = os.path.join(PROJECT_DIR, '招生数据_clean.csv')
-    try:
-        buf = io.StringIO()
-        old_stdout = sys.stdout
-        sys.stdout = buf
-        try:
-            Clean_Data.clean_file(Path(inp), Path(outp))
-        finally:
-            sys.stdout = old_stdout
-        s = buf.getvalue()
-        with open(log_path, 'w', encoding='utf-8') as f:
-            f.write('=== CLEAN OUTPUT ===\n')
-            f.write(s)
-        flash('清洗完成，日志已写入 last_action.log')
-    except Exception as e:
-        flash('清洗出错: ' + str(e))
-    return redirect(url_for('index'))
+    """后台调用 Clean_Data.clean_file 把 `招生数据.csv` 清洗为 `招生数据_clean.csv`。"""
+    return _submit('clean')
+
+
+@app.route('/jobs')
+def jobs_list():
+    return jsonify([job.to_dict() for job in JOBS.list()])
+
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """任务状态和结果；?log=1 时附带完整日志。"""
+    job = JOBS.get(job_id)
+    if job is None:
+        return jsonify({'error': '任务不存在'}), 404
+    return jsonify(job.to_dict(with_log=request.args.get('log') == '1'))
 
 
 @app.route('/plot_school_major', methods=['POST'])
@@ -207,24 +326,24 @@ def plot_school_major():
     year_max = int(request.form.get('year_max') or 2024)
     log_path = os.path.join(PROJECT_DIR, 'last_action.log')
     try:
+        analysis = load_analysis()
         buf = io.StringIO()
-        old_stdout = sys.stdout
-        sys.stdout = buf
-        try:
-            df = analysis.load_and_clean()
-            analysis.plot_school_major_yearly(df, school=school, major=major, year_min=year_min, year_max=year_max)
-        finally:
-            sys.stdout = old_stdout
+        with capture_output(buf):
+            cube = dataset().cube()
+            with analysis.PLOT_LOCK:
+                analysis.plot_school_major_yearly(cube.df, school=school, major=major, year_min=year_min, year_max=year_max, cube=cube)
         s = buf.getvalue()
         with open(log_path, 'w', encoding='utf-8') as f:
             f.write('=== PLOT school-major OUTPUT ===\n')
             f.write(s)
+        LOG_TAILER.notify()
         flash('已生成学校-专业趋势图，日志已写入 last_action.log')
     except Exception:
         tb = traceback.format_exc()
         with open(log_path, 'w', encoding='utf-8') as f:
             f.write('=== PLOT school-major EXCEPTION ===\n')
             f.write(tb)
+        LOG_TAILER.notify()
         flash('生成图表出错，详情见 last_action.log')
     return redirect(url_for('index'))
 
@@ -241,55 +360,230 @@ def plot_school_majors():
         majors = [m.strip() for m in majors_raw.split('\n') if m.strip()]
     log_path = os.path.join(PROJECT_DIR, 'last_action.log')
     try:
+        analysis = load_analysis()
         buf = io.StringIO()
-        old_stdout = sys.stdout
-        sys.stdout = buf
-        try:
-            df = analysis.load_and_clean()
-            analysis.plot_school_multiple_majors(df, school=school, majors=majors, metric=metric, year_min=year_min, year_max=year_max)
-        finally:
-            sys.stdout = old_stdout
+        with capture_output(buf):
+            cube = dataset().cube()
+            with analysis.PLOT_LOCK:
+                analysis.plot_school_multiple_majors(cube.df, school=school, majors=majors, metric=metric, year_min=year_min, year_max=year_max, cube=cube)
         s = buf.getvalue()
         with open(log_path, 'w', encoding='utf-8') as f:
             f.write('=== PLOT school-majors OUTPUT ===\n')
             f.write(s)
+        LOG_TAILER.notify()
         flash('已生成学校多专业趋势图，日志已写入 last_action.log')
     except Exception:
         tb = traceback.format_exc()
         with open(log_path, 'w', encoding='utf-8') as f:
             f.write('=== PLOT school-majors EXCEPTION ===\n')
             f.write(tb)
+        LOG_TAILER.notify()
         flash('生成图表出错，详情见 last_action.log')
     return redirect(url_for('index'))
 
 
 @app.route('/figures/<path:filename>')
 def figures(filename):
-    return send_from_directory(OUT_DIR, filename)
+    """figures 目录下的文件，ETag 为内容哈希，浏览器重新验证时返回 304。
+
+    带 ?v=<哈希前 16 位> 且与当前内容一致时（首页生成的链接），允许浏览器长期缓存不再验证；
+    内容变了链接也会变。
+    """
+    path = safe_join(OUT_DIR, filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+    digest = _file_hash(path)
+    immutable = request.args.get('v') == digest[:16]
+    resp = send_from_directory(OUT_DIR, filename, etag=digest, max_age=31536000 if immutable else None)
+    if immutable:
+        resp.cache_control.immutable = True
+    else:
+        resp.cache_control.no_cache = True  # 可以缓存，但每次都要用 ETag 重新验证
+    return resp
+
+
+# 最近生成的图表字节，键为 ETag
+_CHART_CACHE = OrderedDict()
+_CHART_CACHE_SIZE = 64
+_chart_cache_lock = threading.Lock()
+
+
+def _chart_params(chart, analysis):
+    """从查询参数中取出图表参数，参数不合法时抛出 ValueError。"""
+    args = request.args
+    params = {
+        'school': args.get('school', '四川大学'),
+        'year_min': args.get('year_min', 2020, type=int),
+        'year_max': args.get('year_max', 2024, type=int),
+    }
+    if chart == 'school_major':
+        params['major'] = args.get('major', '临床医学')
+    else:
+        majors = [m.strip() for raw in args.getlist('majors') for m in raw.splitlines() if m.strip()]
+        params['majors'] = majors or None
+        params['metric'] = args.get('metric') or '平均分'
+        if params['metric'] not in analysis.NUMERIC_COLS:
+            raise ValueError(f"metric 必须是 {'、'.join(analysis.NUMERIC_COLS)} 之一")
+        params['top_n'] = args.get('top_n', 6, type=int)
+    return params
+
+
+@app.route('/chart/<chart>')
+def chart(chart):
+    """直接返回图表图片（不写 figures/），例如 /chart/school_major?school=四川大学&major=临床医学&format=svg。
+
+    ETag 由数据内容哈希和参数决定，浏览器带 If-None-Match 重新验证时返回 304。
+    """
+    analysis = load_analysis()
+    fmt = request.args.get('format', 'png')
+    if chart not in analysis.CHART_FUNCS or fmt not in analysis.CHART_FORMATS:
+        return Response('不支持的图表或格式', status=404, mimetype='text/plain')
+    try:
+        params = _chart_params(chart, analysis)
+    except ValueError as e:
+        return Response(str(e), status=400, mimetype='text/plain')
+    cube = dataset().cube()
+    key = json.dumps([analysis.dataset_hash(cube.df), chart, fmt, params], ensure_ascii=False, sort_keys=True)
+    etag = hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    with _chart_cache_lock:
+        body = _CHART_CACHE.get(etag)
+        if body is not None:
+            _CHART_CACHE.move_to_end(etag)
+    if body is None and request.if_none_match.contains(etag):
+        body = b''  # 浏览器已有这张图，make_conditional 会返回 304，不必重新绘制
+    elif body is None:
+        try:
+            body, message = analysis.render_chart(chart, cube.df, fmt=fmt, cube=cube, **params)
+        except (KeyError, TypeError, ValueError) as e:
+            return Response(f'参数错误：{e}', status=400, mimetype='text/plain')
+        if body is None:
+            return Response(message.strip() or '没有数据', status=404, mimetype='text/plain')
+        with _chart_cache_lock:
+            _CHART_CACHE[etag] = body
+            while len(_CHART_CACHE) > _CHART_CACHE_SIZE:
+                _CHART_CACHE.popitem(last=False)
+
+    resp = Response(body, mimetype=analysis.CHART_FORMATS[fmt])
+    resp.set_etag(etag)
+    resp.headers['Cache-Control'] = 'no-cache'  # 可以缓存，但每次都要用 ETag 重新验证（数据可能已更新）
+    return resp.make_conditional(request)
+
+
+def _number_list(values):
+    """把 [600, '610,620'] 这样的输入展开为浮点数列表。"""
+    out = []
+    for v in values:
+        if isinstance(v, str):
+            out.extend(float(x) for x in v.split(',') if x.strip())
+        else:
+            out.append(float(v))
+    return out
+
+
+def _json_numbers(arr):
+    return [None if v != v else round(float(v), 2) for v in arr]  # NaN -> null
+
+
+@app.route('/api/score_rank', methods=['GET', 'POST'])
+def api_score_rank():
+    """分数/位次互查接口。
+
+    GET  /api/score_rank?year=2023&kelei=理科&scores=600,620&ranks=5000
+    POST /api/score_rank  {"year": 2023, "kelei": "理科", "scores": [600, 620], "ranks": [5000]}
+    不带 year/kelei 时返回可查询的 (年份, 科类) 列表。
+    """
+    load_analysis()
+    import score_rank
+    index = dataset().derived('score_rank', score_rank.ScoreRankIndex)
+    if request.method == 'POST':
+        payload = request.get_json(silent=True) or {}
+        scores, ranks = payload.get('scores', []), payload.get('ranks', [])
+        scores = scores if isinstance(scores, list) else [scores]
+        ranks = ranks if isinstance(ranks, list) else [ranks]
+    else:
+        payload = request.args
+        scores, ranks = request.args.getlist('scores'), request.args.getlist('ranks')
+    year, kelei = payload.get('year'), payload.get('kelei')
+    if year is None or kelei is None:
+        return jsonify({'available': [{'year': y, 'kelei': k} for y, k in index.keys()]})
+    try:
+        scores, ranks = _number_list(scores), _number_list(ranks)
+        result = {'year': int(year), 'kelei': kelei}
+        if scores:
+            result['scores'] = scores
+            result['score_to_rank'] = _json_numbers(index.score_to_rank(year, kelei, scores))
+        if ranks:
+            result['ranks'] = ranks
+            result['rank_to_score'] = _json_numbers(index.rank_to_score(year, kelei, ranks))
+    except KeyError as e:
+        return jsonify({'error': e.args[0]}), 404
+    except (TypeError, ValueError):
+        return jsonify({'error': 'year、scores、ranks 必须是数字'}), 400
+    return jsonify(result)
+
+
+@app.route('/api/recommend')
+def api_recommend():
+    """按分数或位次推荐 (学校, 专业)：/api/recommend?score=620&kelei=理科 或 ?rank=5000[&kelei=理科]
+
+    可选参数 top_k（默认 30）、min_prob（默认 0.1）、year（分数换算位次用的年份，默认最近一年）。
+    """
+    load_analysis()
+    import recommend
+    rec = dataset().derived('recommender', recommend.Recommender)
+    args = request.args
+    try:
+        table = rec.recommend(rank=args.get('rank', type=float), score=args.get('score', type=float),
+                              kelei=args.get('kelei') or None, year=args.get('year', type=int),
+                              top_k=args.get('top_k', 30, type=int), min_prob=args.get('min_prob', 0.1, type=float))
+    except KeyError as e:
+        return jsonify({'error': e.args[0]}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    options = [
+        {'school': r.学校, 'major': r.专业, 'kelei': r.科类, 'years': int(r.years),
+         'last_year': int(r.last_year), 'last_rank': float(r.last_rank),
+         'chance': round(float(r.chance), 3), 'level': r.level}
+        for r in table.itertuples(index=False)
+    ]
+    return jsonify({'rank': round(table.attrs['rank'], 1), 'options': options})
+
+
+# 一个 SSE 连接最长保持的秒数；到时服务端关闭，浏览器带 Last-Event-ID 自动重连
+STREAM_LOG_LIFETIME = 300
+STREAM_LOG_HEARTBEAT = 15
+
+
+def _sse_event(pos, text, event=None):
+    """SSE 消息：每行一个 data 字段（浏览器会用换行拼回去），id 为日志位置。"""
+    lines = [f'id: {pos}']
+    if event:
+        lines.append(f'event: {event}')
+    text = text.replace('\r\n', '\n').replace('\r', '\n')
+    lines.extend('data: ' + line for line in text.split('\n'))
+    return '\n'.join(lines) + '\n\n'
 
 
 @app.route('/stream_log')
 def stream_log():
-    """SSE endpoint: 每秒检查 last_action.log 的变化并推送内容。"""
+    """SSE endpoint: 推送 last_action.log 新追加的内容。
+
+    message 事件的内容追加到日志末尾；reset 事件（首次连接、日志被清空或位置失效）替换全部内容。
+    重连时浏览器发送 Last-Event-ID，首次连接可用 ?pos= 传入页面渲染时的位置，避免重复发送。
+    """
+    pos = request.headers.get('Last-Event-ID') or request.args.get('pos')
+
     def gen():
-        log_path = os.path.join(PROJECT_DIR, 'last_action.log')
-        last_text = ''
-        while True:
-            try:
-                if os.path.exists(log_path):
-                    with open(log_path, 'r', encoding='utf-8') as f:
-                        text = f.read()
-                else:
-                    text = ''
-            except Exception:
-                text = '无法读取日志文件'
-
-            if text != last_text:
-                # SSE 格式
-                for chunk in (text,):
-                    yield f"data: {chunk.replace('\n', '\\n')}\n\n"
-                last_text = text
-            time.sleep(1)
+        yield 'retry: 2000\n\n'
+        deadline = time.monotonic() + STREAM_LOG_LIFETIME
+        for new_pos, reset, text in LOG_TAILER.follow(pos, timeout=STREAM_LOG_HEARTBEAT):
+            if text or reset:
+                yield _sse_event(new_pos, text, 'reset' if reset else None)
+            else:
+                yield ': keep-alive\n\n'  # 心跳；客户端已断开时在这里结束生成器
+            if time.monotonic() > deadline:
+                break
 
     # 防止中间代理缓存并保持 Flask 上下文
     return Response(stream_with_context(gen()), mimetype='text/event-stream', headers={
@@ -299,5 +593,10 @@ def stream_log():
 
 
 if __name__ == '__main__':
-
+    # debug 模式下由重载器启动的子进程（WERKZEUG_RUN_MAIN=true）才真正处理请求
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_warm_up()
     app.run(debug=True, port=5000)
+elif __name__ != '__mp_main__':
+    # spawn 启动的绘图进程会以 __mp_main__ 的名字重新导入本文件，那里不需要预热
+    start_warm_up()
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""Compare the old regex fixed-point cleaner with Clean_Data.clean_line.
+
+Checks that both give identical output for every line of 招生数据.csv and
+reports per-line throughput for the real lines and for a long nested line.
+
+Usage: python benchmarks/bench_clean.py [--repeat 20]
+"""
+import argparse
+import os
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Clean_Data
+
+
+def legacy_remove_parentheses_and_contents(s: str) -> str:
+    patterns = [
+        r"\([^()]*\)",
+        r"（[^（）]*）",
+        r"\[[^\[\]]*\]",
+        r"\{[^{}]*\}",
+        r"<[^<>]*>",
+        r"【[^】]*】",
+        r"《[^》]*》",
+        r"〖[^〗]*〗",
+        r"〔[^〕]*〕",
+    ]
+    prev = None
+    while prev != s:
+        prev = s
+        for p in patterns:
+            s = re.sub(p, "", s)
+    leftover = r"[\(\)\[\]\{\}<>（）【】《》〖〗〔〕]+"
+    s = re.sub(leftover, "", s)
+    return s
+
+
+def legacy_remove_quotes(s: str) -> str:
+    quotes = '"\'“”‘’『』「」‹›«»'
+    return s.translate({ord(c): None for c in quotes})
+
+
+def legacy_clean_line(line: str) -> str:
+    line = legacy_remove_parentheses_and_contents(line)
+    line = legacy_remove_quotes(line)
+    line = re.sub(r"学制\s*\d+\s*年", "", line)
+    return line.strip()
+
+
+def throughput(func, lines, repeat):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        for line in lines:
+            func(line)
+    elapsed = time.perf_counter() - t0
+    return len(lines) * repeat / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--input', default=str(Path(__file__).parent.parent / '招生数据.csv'))
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    path = Path(args.input)
+    enc = Clean_Data.detect_encoding(path)
+    with path.open('r', encoding=enc, errors='ignore') as f:
+        lines = [line.rstrip('\n\r') for line in f]
+
+    mismatches = [line for line in lines if legacy_clean_line(line) != Clean_Data.clean_line(line)]
+    print(f'{path.name}: {len(lines)} lines, {len(mismatches)} mismatches')
+    for line in mismatches[:5]:
+        print('  ', line)
+
+    nested = '（'.join(['专业'] * 200) + '）' * 200
+    long_line = ','.join(['临床医学（八年）（江安校区）【"强基"】学制5年'] * 50)
+    cases = [('real lines', lines, args.repeat), ('nested x200', [nested], 5), ('long line', [long_line], 50)]
+    for name, sample, repeat in cases:
+        assert all(legacy_clean_line(x) == Clean_Data.clean_line(x) for x in sample)
+        before = throughput(legacy_clean_line, sample, repeat)
+        after = throughput(Clean_Data.clean_line, sample, repeat)
+        print(f'{name:12s} before {before:12,.0f} lines/s  after {after:12,.0f} lines/s  ({after / before:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
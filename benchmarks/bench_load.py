@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""对比 analysis.load_and_clean 直接解析 CSV 与读取 Feather 缓存的耗时和内存占用。
+
+把 招生数据_clean.csv 复制 `--scale` 份（学校名加编号，模拟更多学校）生成临时大文件后测量。
+用法: python benchmarks/bench_load.py [--scale 300]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+import analysis
+
+
+def legacy_load(path):
+    df = pd.read_csv(path)
+    for c in analysis.NUMERIC_COLS:
+        if c in df.columns:
+            df[c] = pd.to_numeric(df[c], errors='coerce')
+    return df.dropna(how='all')
+
+
+def timed(func, *args, repeat=3, **kwargs):
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = func(*args, **kwargs)
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scale', type=int, default=300)
+    args = parser.parse_args()
+
+    base = pd.read_csv(analysis.DATA_PATH)
+    parts = []
+    for i in range(args.scale):
+        part = base.copy()
+        part['学校'] = part['学校'] + str(i % 500)
+        parts.append(part)
+    big = pd.concat(parts, ignore_index=True)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.csv')
+        big.to_csv(path, index=False)
+        t_legacy, df_legacy = timed(legacy_load, path)
+        t_csv, _ = timed(analysis.load_and_clean, path, use_cache=False)
+        analysis.load_and_clean(path)  # 建立缓存
+        t_cache, df_cache = timed(analysis.load_and_clean, path)
+        size_mb = os.path.getsize(path) / 1e6
+
+    mem_legacy = df_legacy.memory_usage(deep=True).sum() / 1e6
+    mem_cache = df_cache.memory_usage(deep=True).sum() / 1e6
+    print(f'{len(big)} 行, CSV {size_mb:.1f} MB')
+    print(f'原先解析 CSV:       {t_legacy * 1000:8.1f} ms, 内存 {mem_legacy:7.1f} MB')
+    print(f'解析 CSV + 转换类型: {t_csv * 1000:8.1f} ms')
+    print(f'读取 Feather 缓存:  {t_cache * 1000:8.1f} ms, 内存 {mem_cache:7.1f} MB')
+    print(f'加载加速 {t_legacy / t_cache:.1f}x, 内存减少 {mem_legacy / mem_cache:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""测量 recommend.Recommender 的查询耗时：单个考生、以及一次给整批考生打分。
+
+把 招生数据_clean.csv 复制 `--scale` 份（学校名加编号）模拟上万个 (学校, 专业)，
+并与逐个专业用 math.erf 计算的 Python 循环对比（循环只跑一小部分考生后按比例换算）。
+用法: python benchmarks/bench_recommend.py [--scale 300] [--students 1000]
+"""
+import argparse
+import math
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+import analysis
+import recommend
+
+
+def loop_chances(history, rank):
+    out = []
+    for mu, sigma in zip(history['mu'], history['sigma']):
+        z = (mu - math.log(rank)) / sigma
+        out.append(0.5 * (1 + math.erf(z / math.sqrt(2))))
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scale', type=int, default=300)
+    parser.add_argument('--students', type=int, default=1000)
+    args = parser.parse_args()
+
+    base = analysis.load_and_clean()
+    parts = []
+    for i in range(args.scale):
+        part = base.copy()
+        part['学校'] = part['学校'].astype(str) + str(i)
+        parts.append(part)
+    df = pd.concat(parts, ignore_index=True)
+
+    t0 = time.perf_counter()
+    rec = recommend.Recommender(df)
+    t_build = time.perf_counter() - t0
+    n_majors = len(rec.history)
+    ranks = np.random.default_rng(0).uniform(1000, 40000, args.students)
+
+    t0 = time.perf_counter()
+    for r in ranks[:20]:
+        rec.recommend(rank=r, kelei='理科')
+    t_single = (time.perf_counter() - t0) / 20
+
+    t0 = time.perf_counter()
+    idx, probs = rec.top_options(ranks, kelei='理科')
+    t_batch = time.perf_counter() - t0
+
+    sample = ranks[:5]
+    t0 = time.perf_counter()
+    expected = [loop_chances(rec.history, r) for r in sample]
+    t_loop = (time.perf_counter() - t0) / len(sample) * len(ranks)
+    err = np.abs(rec.chances(sample) - np.array(expected)).max()
+
+    print(f'{n_majors} 个 (学校, 专业, 科类)，{len(df)} 行历史数据，建表 {t_build * 1000:.0f} ms')
+    print(f'单个考生推荐:            {t_single * 1000:8.2f} ms')
+    print(f'{len(ranks)} 名考生一次打分:    {t_batch * 1000:8.1f} ms')
+    print(f'Python 循环（估算）:      {t_loop * 1000:8.0f} ms')
+    print(f'与 math.erf 结果的最大误差 {err:.1e}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""对比 analysis.render_figures 顺序绘图与进程池并行绘图的耗时，并检查输出文件是否逐字节一致。
+
+用法: python benchmarks/bench_render.py [--workers 6]
+"""
+import argparse
+import filecmp
+import os
+import sys
+import tempfile
+import time
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import matplotlib
+matplotlib.use('Agg')
+import analysis
+
+
+def render(cube, out_dir, workers):
+    analysis.OUT_DIR = out_dir
+    t0 = time.perf_counter()
+    analysis.render_figures(cube, workers)
+    return time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=len(analysis.FIGURE_JOBS))
+    args = parser.parse_args()
+    warnings.filterwarnings('ignore')
+    analysis.FIGURE_CACHE = False  # 只比较绘图本身
+    analysis._set_fonts()
+
+    cube = analysis.AggregateCube(analysis.load_and_clean())
+    with tempfile.TemporaryDirectory() as seq_dir, tempfile.TemporaryDirectory() as par_dir:
+        t_seq = render(cube, seq_dir, 1)
+        t_par = render(cube, par_dir, args.workers)
+        names = sorted(n for n in os.listdir(seq_dir) if not n.startswith('.'))
+        _, mismatch, errors = filecmp.cmpfiles(seq_dir, par_dir, names, shallow=False)
+
+    print(f'CPU 核数 {os.cpu_count()}, 图表 {len(names)} 张')
+    print(f'顺序绘图:          {t_seq:6.2f} s')
+    print(f'并行绘图 ({args.workers} 进程): {t_par:6.2f} s')
+    print('输出一致' if not mismatch and not errors else f'输出不一致: {mismatch + errors}')
+
+
+if __name__ == '__main__':
+    main()
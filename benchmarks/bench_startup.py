@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""测量 app.py 的启动耗时：从启动 Python 进程到第一次响应 / 以及第一次响应图表接口的时间。
+
+对比三种方式（每种在新进程中运行 `--repeat` 次取中位数）:
+  - 启动时导入分析模块（改动前的做法，先 import analysis 再 import app）
+  - 延迟导入，不预热（APP_WARMUP=0）
+  - 延迟导入 + 后台预热（默认）
+用法: python benchmarks/bench_startup.py [--repeat 5]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r'''
+import json, sys, time
+sys.path.insert(0, {root!r})
+t0 = float(sys.argv[1])
+if sys.argv[2] == 'eager':
+    import analysis
+import app
+client = app.app.test_client()
+assert client.get('/').status_code == 200
+t_index = time.time() - t0
+client.get('/chart/school_major')
+t_chart = time.time() - t0
+print(json.dumps({{'index': t_index, 'chart': t_chart}}))
+'''
+
+
+def run_once(mode):
+    env = dict(os.environ, MPLBACKEND='Agg')
+    env['APP_WARMUP'] = '1' if mode == 'warm' else '0'
+    code = CHILD.format(root=ROOT)
+    out = subprocess.run([sys.executable, '-c', code, repr(time.time()), mode],
+                         env=env, cwd=ROOT, capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    modes = [('eager', '启动时导入 analysis'), ('lazy', '延迟导入，不预热'), ('warm', '延迟导入 + 后台预热')]
+    for mode, title in modes:
+        runs = [run_once(mode) for _ in range(args.repeat)]
+        t_index = statistics.median(r['index'] for r in runs)
+        t_chart = statistics.median(r['chart'] for r in runs)
+        print(f'{title:<16} 首次响应 / {t_index * 1000:7.0f} ms, 首次响应图表 {t_chart * 1000:7.0f} ms')
+
+
+if __name__ == '__main__':
+    main()
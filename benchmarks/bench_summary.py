@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""对比 summary_stats（整表读入内存）与 summary_stats_chunked（分块读取）的耗时、峰值内存和输出。
+
+把 招生数据_clean.csv 复制 `--scale` 份（学校名加编号）生成临时大文件后测量，峰值内存用 tracemalloc 统计。
+用法: python benchmarks/bench_summary.py [--scale 1000] [--chunksize 100000]
+"""
+import argparse
+import filecmp
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+import analysis
+
+
+def measure(func, *args, **kwargs):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    result = func(*args, **kwargs)
+    elapsed = time.perf_counter() - t0
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak / 1e6, result
+
+
+def in_memory(path):
+    return analysis.summary_stats(analysis.load_and_clean(path, use_cache=False))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scale', type=int, default=1000)
+    parser.add_argument('--chunksize', type=int, default=100_000)
+    args = parser.parse_args()
+
+    base = pd.read_csv(analysis.DATA_PATH)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.csv')
+        for i in range(args.scale):
+            part = base.copy()
+            part['学校'] = part['学校'] + str(i % 500)
+            part.to_csv(path, mode='a', header=(i == 0), index=False)
+        size_mb = os.path.getsize(path) / 1e6
+
+        t_mem, peak_mem, s_mem = measure(in_memory, path)
+        t_chunk, peak_chunk, s_chunk = measure(analysis.summary_stats_chunked, path, chunksize=args.chunksize)
+        analysis.save_summary_text(s_mem, os.path.join(tmp, 'a.txt'))
+        analysis.save_summary_text(s_chunk, os.path.join(tmp, 'b.txt'))
+        same = filecmp.cmp(os.path.join(tmp, 'a.txt'), os.path.join(tmp, 'b.txt'), shallow=False)
+
+    print(f'{s_mem["shape"][0]} 行, CSV {size_mb:.1f} MB, 每块 {args.chunksize} 行')
+    print(f'整表读入:  {t_mem:6.2f} s, 峰值内存 {peak_mem:7.1f} MB')
+    print(f'分块统计:  {t_chunk:6.2f} s, 峰值内存 {peak_chunk:7.1f} MB')
+    print('摘要文本一致' if same else f'摘要文本不一致（近似分位数列: {s_chunk["approximate_quantiles"]}）')
+
+
+if __name__ == '__main__':
+    main()
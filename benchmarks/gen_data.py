@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""生成与 招生数据.csv 格式相同的合成招生数据，用于在 10×/100×/1000× 规模下测性能。
+
+- 列与爬取结果一致（学校, 专业, 最低分, ..., 专业类别），每个规模约 420 × scale 行。
+- 专业名带有 Clean_Data 需要去掉的噪声：各种括号（含嵌套）、中英文引号、带逗号的备注
+  （整个字段加引号）、学制N年；约四分之一的行 专业类别 为 "--"（清洗时跳过）。
+- 分数按学校档次 + 专业热度 + 年度波动生成，平均分/最高分在最低分之上；
+  最低位次按各科类的“分数 -> 位次”曲线换算（按当年一本线平移）并加少量噪声，分数越高位次越小。
+- 同样的 scale 和 seed 总是生成逐字节相同的文件。
+
+用法: python benchmarks/gen_data.py --scale 100 [--seed 0] [--out 招生数据_100x.csv]
+"""
+import argparse
+import os
+
+import numpy as np
+
+COLUMNS = ['学校', '专业', '最低分', '平均分', '最高分', '招生年份', '科类', '批次', '最低位次', '省控线', '专业类别']
+YEARS = [2020, 2021, 2022, 2023, 2024]
+
+# (学校, 档次分数)；规模大于 1 时在后面加编号生成更多学校
+SCHOOLS = [('四川大学', 655), ('电子科技大学', 650), ('成都中医药大学', 590), ('西南财经大学', 630),
+           ('西南交通大学', 625), ('西南科技大学', 575), ('成都大学', 560), ('成都信息工程大学', 565),
+           ('四川轻化工大学', 550), ('西华大学', 555), ('四川农业大学', 570)]
+
+# (专业, 专业类别, 热度加分, 科类)
+MAJORS = [
+    ('临床医学', '临床医学类', 22, '理科'), ('口腔医学', '口腔医学类', 18, '理科'),
+    ('计算机科学与技术', '计算机类', 16, '理科'), ('软件工程', '计算机类', 12, '理科'),
+    ('电子信息工程', '电子信息类', 12, '理科'), ('数学与应用数学', '数学类', 8, '理科'),
+    ('物理学', '物理学类', 4, '理科'), ('化学', '化学类', 0, '理科'),
+    ('机械设计制造及其自动化', '机械类', 2, '理科'), ('土木工程', '土木类', -4, '理科'),
+    ('生物科学', '生物科学类', -2, '理科'), ('药学', '药学类', 6, '理科'),
+    ('护理学', '护理学类', -6, '理科'), ('材料科学与工程', '材料类', -3, '理科'),
+    ('环境工程', '环境科学与工程类', -8, '理科'), ('工科试验班', '工科试验班', 6, '理科'),
+    ('金融学', '金融学类', 10, '文科'), ('法学', '法学类', 9, '文科'),
+    ('汉语言文学', '中国语言文学类', 6, '文科'), ('会计学', '工商管理类', 8, '文科'),
+    ('英语', '外国语言文学类', 3, '文科'), ('新闻学', '新闻传播学类', 2, '文科'),
+]
+
+# 各年份各科类的本科一批/二批省控线
+BATCH_LINES = {
+    '理科': {2020: (529, 443), 2021: (521, 426), 2022: (515, 426), 2023: (520, 433), 2024: (539, 459)},
+    '文科': {2020: (527, 459), 2021: (541, 466), 2022: (538, 466), 2023: (527, 458), 2024: (529, 467)},
+}
+# 2020 年的 分数 -> 位次 锚点（其余年份按一本线的变化平移分数），中间按对数位次线性插值
+RANK_CURVE = {
+    '理科': ([450, 529, 560, 600, 633, 660, 686, 700], [180000, 70000, 45000, 20000, 7500, 2800, 300, 50]),
+    '文科': ([460, 527, 560, 600, 640, 660], [50000, 15000, 6000, 1200, 80, 10]),
+}
+
+CAMPUSES = ['江安校区', '望江校区', '华西校区', '清水河校区', '沙河校区', '温江校区']
+NOTES = ['专业备注:该专业对收费有特殊要求,详见院校招生章程.', '招收英语,法语语种考生',
+         '专业备注:“化工+计算机信息”交叉专业融合创新班', '专业备注：教育部“卓越工程师”计划,中外合作办学']
+
+
+def _rank(kelei, score):
+    scores, ranks = RANK_CURVE[kelei]
+    return float(np.exp(np.interp(score, scores, np.log(ranks))))
+
+
+def _noisy_name(rng, name):
+    """给专业名加上爬取数据中常见的噪声，返回 CSV 字段（含逗号时加引号）。"""
+    parts = [name]
+    r = rng.random(7)
+    if r[0] < 0.15:
+        parts.append(['（五年）', '（八年）', '（Ⅷ）（口腔）', '（V）（五年）'][rng.integers(4)])
+    if r[1] < 0.10:
+        parts.append(f'（包含专业：{name}（{CAMPUSES[rng.integers(len(CAMPUSES))]}交叉试验班））')
+    if r[2] < 0.50:
+        parts.append(f'（{CAMPUSES[rng.integers(len(CAMPUSES))]}）')
+    if r[3] < 0.04:
+        parts.append(['【中外合作】', '《双学位》', '[基地班]', '〖强基〗', '〔拔尖〕'][rng.integers(5)])
+    if r[4] < 0.05:
+        parts.append('学制4年')
+    if r[5] < 0.05:
+        parts.append('"')  # 落单的引号，由 Clean_Data 删除
+    if r[6] < 0.20:
+        parts.append(f'（{NOTES[rng.integers(len(NOTES))]}）')
+    field = ''.join(parts)
+    if ',' in field or '"' in field:
+        field = '"' + field.replace('"', '""') + '"'
+    return field
+
+
+def generate_rows(scale=1, seed=0):
+    """生成约 420 × scale 行原始数据（不含表头），返回 CSV 行的列表。"""
+    rng = np.random.default_rng(seed)
+    n_schools = max(3, round(4 * scale))
+    lines = []
+    for s in range(n_schools):
+        base_name, tier = SCHOOLS[s % len(SCHOOLS)]
+        school = base_name if s < len(SCHOOLS) else f'{base_name}{s // len(SCHOOLS)}'
+        tier = tier + rng.normal(0, 8) if s >= 3 else tier
+        batch = '本科一批' if tier >= 575 else '本科二批'
+        # 每个学校开设的专业（四川大学开设全部专业，便于固定参数的绘图基准）
+        offered = [m for m in MAJORS if s == 0 or rng.random() < 0.7]
+        for year in YEARS:
+            drift = rng.normal(0, 3)
+            for major, category, hot, kelei in offered:
+                for _ in range(1 + (rng.random() < 0.35)):  # 部分专业有多个方向/校区
+                    line1, line2 = BATCH_LINES[kelei][year]
+                    control = line1 if batch == '本科一批' else line2
+                    shift = 0 if kelei == '理科' else -5
+                    low = int(np.clip(round(tier + shift + hot + drift + rng.normal(0, 5)), control + 1, 700))
+                    avg = min(low + int(rng.gamma(2.0, 1.5)), 705)
+                    high = min(avg + int(rng.gamma(2.0, 3.0)), 710)
+                    rank = int(max(1, round(_rank(kelei, low - (line1 - BATCH_LINES[kelei][2020][0]))
+                                            * rng.lognormal(0, 0.03))))
+                    cat = '--' if rng.random() < 0.24 else category
+                    lines.append(','.join([school, _noisy_name(rng, major), str(low), str(avg), str(high),
+                                           str(year), kelei, batch, str(rank), str(control), cat]))
+    return lines
+
+
+def write_csv(path, scale=1, seed=0):
+    """写出合成的原始数据 CSV（utf-8，与 Data_request.py 的输出格式相同），返回行数。"""
+    lines = generate_rows(scale, seed)
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        f.write(','.join(COLUMNS) + '\n')
+        f.write('\n'.join(lines) + '\n')
+    return len(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='生成合成招生数据')
+    parser.add_argument('--scale', type=float, default=10, help='相对 招生数据.csv（约 420 行）的倍数')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default=None, help='输出路径（默认 招生数据_<scale>x.csv）')
+    args = parser.parse_args()
+    out = args.out or f'招生数据_{args.scale:g}x.csv'
+    n = write_csv(out, args.scale, args.seed)
+    print(f'已写入 {out}：{n} 行，{os.path.getsize(out) / 1e6:.1f} MB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""api.zjzw.cn 专业分数线接口的本地模拟服务，供爬虫基准测试使用。
+
+每个 school_id 的专业数量由 school_id 确定性生成；每次请求固定延迟 `latency` 秒，
+可选按 `fail_rate` 概率返回 503，用来观察重试行为；`with_total=False` 时响应不带
+numFound 字段，用来测试逐页探测的分页方式。
+"""
+import json
+import random
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+import time
+
+
+def majors_for(school_id):
+    """返回某学校的专业数量（8~80，按 school_id 固定）。"""
+    return random.Random(school_id).randint(8, 80)
+
+
+def make_items(school_id, year, start, stop):
+    items = []
+    for i in range(start, stop):
+        rnd = random.Random(f'{school_id}-{year}-{i}')
+        low = rnd.randint(500, 680)
+        items.append({
+            'name': f'模拟大学{school_id}',
+            'spname': f'专业{i}（学制4年）',
+            'min': low,
+            'average': low + rnd.randint(0, 6),
+            'max': low + rnd.randint(6, 15),
+            'year': year,
+            'local_type_name': '理科',
+            'local_batch_name': '本科一批',
+            'min_section': (700 - low) * 120 + rnd.randint(0, 100),
+            'proscore': 529,
+            'level3_name': f'类别{i % 7}',
+        })
+    return items
+
+
+class MockState:
+    def __init__(self, latency=0.05, fail_rate=0.0, with_total=True):
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.with_total = with_total
+        self.requests = 0
+        self.lock = threading.Lock()
+
+
+def _make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            with state.lock:
+                state.requests += 1
+                fail = random.random() < state.fail_rate
+            time.sleep(state.latency)
+            if fail:
+                self.send_response(503)
+                self.end_headers()
+                return
+            q = parse_qs(urlsplit(self.path).query)
+            school_id = int(q.get('school_id', ['0'])[0])
+            year = int(q.get('year', ['2020'])[0])
+            page = int(q.get('page', ['1'])[0])
+            size = int(q.get('size', ['10'])[0])
+            total = majors_for(school_id)
+            start = (page - 1) * size
+            items = make_items(school_id, year, start, min(total, start + size))
+            data = {'item': items}
+            if state.with_total:
+                data['numFound'] = total
+            body = json.dumps({'code': '0000', 'message': '成功', 'data': data}, ensure_ascii=False).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def start_mock_server(latency=0.05, fail_rate=0.0, with_total=True):
+    """在后台线程启动模拟服务，返回 (server, base_url, state)。"""
+    state = MockState(latency, fail_rate, with_total)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+    return server, f'http://{host}:{port}', state
@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+"""整条流水线的基准测试：用 gen_data.py 生成 10×/100×（可选 1000×）规模的数据，逐项计时，
+结果写入 JSON，并与保存的基线对比。
+
+计时项目（每项取 --repeat 次中最快的一次，单位秒）：
+    detect_encoding, clean_file, load_csv（不用缓存）, load_cache（Feather 缓存）, summary_stats,
+    plot/<FIGURE_JOBS 中的每个绘图函数>（关闭图表缓存），
+    route/plot_school_major, route/plot_school_majors, route/chart_school_major, route/chart_school_majors
+    （Flask test client，数据集已加载）
+
+比当前基线慢超过 --tolerance（且绝对差超过 --min-delta 秒）的项目列为回退，此时退出码为 1。
+基线与机器有关：换机器后先用 --update-baseline 重新生成。
+
+用法:
+    python benchmarks/run_suite.py [--scales 10,100] [--repeat 3] [--out benchmarks/results.json]
+    python benchmarks/run_suite.py --update-baseline     # 把本次结果保存为基线
+"""
+import argparse
+import datetime
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+from pathlib import Path
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('APP_WARMUP', '0')  # 导入 app 时不启动预热线程
+
+import matplotlib
+matplotlib.use('Agg')
+import numpy as np
+import pandas as pd
+
+import analysis
+import Clean_Data
+import gen_data
+from output_capture import capture
+
+BASELINE_PATH = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+RESULTS_PATH = os.path.join(ROOT, 'benchmarks', 'results.json')
+
+
+def best_of(func, repeat):
+    """运行 func repeat 次，返回最短耗时（秒）。func 的打印输出被丢弃。"""
+    best = None
+    for _ in range(repeat):
+        with capture(io.StringIO(), io.StringIO()):
+            t0 = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def bench_pipeline(work, raw, repeat):
+    """清洗、加载、摘要和各绘图函数。返回 ({项目: 秒}, 清洗后 CSV 路径)。"""
+    clean = Path(work) / '招生数据_clean.csv'
+    out = {}
+    out['detect_encoding'] = best_of(lambda: Clean_Data.detect_encoding(raw), repeat)
+    out['clean_file'] = best_of(lambda: Clean_Data.clean_file(raw, clean), repeat)
+    out['load_csv'] = best_of(lambda: analysis.load_and_clean(str(clean), use_cache=False), repeat)
+    analysis.load_and_clean(str(clean))  # 写出 Feather 缓存
+    out['load_cache'] = best_of(lambda: analysis.load_and_clean(str(clean)), repeat)
+    df = analysis.load_and_clean(str(clean))
+    out['summary_stats'] = best_of(lambda: analysis.summary_stats(df), repeat)
+
+    analysis.OUT_DIR = os.path.join(work, 'figures')
+    os.makedirs(analysis.OUT_DIR, exist_ok=True)
+    cube = analysis.AggregateCube(df)
+    for _, name, kwargs in analysis.FIGURE_JOBS:
+        out[f'plot/{name}'] = best_of(lambda: analysis._render_figure(cube, name, kwargs), repeat)
+    return out, clean
+
+
+def bench_routes(work, clean, repeat):
+    """Flask 绘图路由的耗时（test client，不经过网络）。"""
+    import app as app_mod
+    app_mod.PROJECT_DIR = work  # 路由把日志写到 PROJECT_DIR/last_action.log，这里放到临时目录
+    app_mod._analysis = analysis
+    app_mod._dataset = analysis.DatasetStore(str(clean))
+    app_mod._dataset.cube()  # 预先加载数据集，只测每个请求的绘图
+    client = app_mod.app.test_client()
+    log_path = os.path.join(work, 'last_action.log')
+
+    def post(url, data):
+        def run():
+            resp = client.post(url, data=data)
+            assert resp.status_code == 302, resp.status_code
+            with open(log_path, encoding='utf-8') as f:
+                if 'EXCEPTION' in f.readline():
+                    raise RuntimeError(f'{url} 出错，见 {log_path}')
+        return run
+
+    def get(url):
+        def run():
+            app_mod._CHART_CACHE.clear()  # 每次都重新绘制
+            resp = client.get(url)
+            assert resp.status_code == 200, (resp.status_code, resp.get_data(as_text=True))
+        return run
+
+    return {
+        'route/plot_school_major': best_of(post('/plot_school_major', {
+            'school': '四川大学', 'major': '临床医学', 'year_min': 2020, 'year_max': 2024}), repeat),
+        'route/plot_school_majors': best_of(post('/plot_school_majors', {
+            'school2': '四川大学', 'majors': '', 'metric': '平均分', 'year_min2': 2020, 'year_max2': 2024}), repeat),
+        'route/chart_school_major': best_of(get('/chart/school_major?school=四川大学&major=临床医学'), repeat),
+        'route/chart_school_majors': best_of(get('/chart/school_majors?school=四川大学&metric=平均分'), repeat),
+    }
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True, timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = ''
+    return {
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'matplotlib': matplotlib.__version__,
+    }
+
+
+def run(scales, repeat, seed, data_dir=None):
+    results = {}
+    rows = {}
+    for scale in scales:
+        with tempfile.TemporaryDirectory() as work:
+            raw = Path(data_dir or work) / f'招生数据_{scale:g}x_seed{seed}.csv'
+            if not raw.exists():
+                gen_data.write_csv(raw, scale, seed)
+            print(f'[{scale:g}x] {raw.stat().st_size / 1e6:.1f} MB 原始数据', flush=True)
+            timings, clean = bench_pipeline(work, raw, repeat)
+            timings.update(bench_routes(work, clean, repeat))
+            rows[f'{scale:g}x'] = len(analysis.load_and_clean(str(clean)))
+            for name, seconds in timings.items():
+                results[f'{scale:g}x/{name}'] = seconds
+                print(f'  {name:<40} {seconds * 1000:10.1f} ms', flush=True)
+    return {'meta': dict(environment(), scales=[f'{s:g}x' for s in scales], repeat=repeat, seed=seed, rows=rows),
+            'results': results}
+
+
+def compare(current, baseline, tolerance, min_delta):
+    """打印与基线的对比表，返回回退的项目列表。"""
+    base_meta = baseline.get('meta', {})
+    for key in ('machine', 'cpus', 'python', 'pandas'):
+        if base_meta.get(key) != current['meta'].get(key):
+            print(f'注意：基线的 {key} 为 {base_meta.get(key)}，本机为 {current["meta"].get(key)}，对比仅供参考')
+    print(f'\n与基线对比（{base_meta.get("date", "?")}，commit {base_meta.get("commit", "?")}）:')
+    print(f'  {"项目":<48} {"基线(ms)":>10} {"本次(ms)":>10} {"比值":>7}')
+    regressions = []
+    for name, seconds in current['results'].items():
+        base = baseline.get('results', {}).get(name)
+        if base is None:
+            print(f'  {name:<50} {"-":>10} {seconds * 1000:10.1f}')
+            continue
+        ratio = seconds / base if base > 0 else float('inf')
+        flag = ''
+        if ratio > 1 + tolerance and seconds - base > min_delta:
+            regressions.append(name)
+            flag = '  <- 变慢'
+        elif ratio < 1 / (1 + tolerance) and base - seconds > min_delta:
+            flag = '  变快'
+        print(f'  {name:<50} {base * 1000:10.1f} {seconds * 1000:10.1f} {ratio:7.2f}{flag}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='流水线基准测试')
+    parser.add_argument('--scales', default='10,100', help='逗号分隔的数据规模倍数，如 10,100,1000')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--data-dir', default=None, help='保存/复用生成的数据（默认每次重新生成到临时目录）')
+    parser.add_argument('--out', default=RESULTS_PATH, help='结果 JSON 路径')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--update-baseline', action='store_true', help='把本次结果写为基线')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='比基线慢多少比例算回退')
+    parser.add_argument('--min-delta', type=float, default=0.005, help='绝对差小于该秒数时不算回退')
+    args = parser.parse_args()
+    warnings.filterwarnings('ignore')
+    analysis.FIGURE_CACHE = False  # 测绘图本身，不测图表缓存
+    analysis._set_fonts()
+    if args.data_dir:
+        os.makedirs(args.data_dir, exist_ok=True)
+
+    current = run([float(s) for s in args.scales.split(',')], args.repeat, args.seed, args.data_dir)
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(current, f, ensure_ascii=False, indent=1)
+    print(f'\n结果已写入 {args.out}')
+
+    if args.update_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(current, f, ensure_ascii=False, indent=1)
+        print(f'基线已更新: {args.baseline}')
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f'没有基线文件 {args.baseline}，用 --update-baseline 生成')
+        return 0
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    regressions = compare(current, baseline, args.tolerance, args.min_delta)
+    if regressions:
+        print(f'\n{len(regressions)} 项比基线慢: {", ".join(regressions)}')
+        return 1
+    print('\n没有发现回退')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""后台任务：把爬取、清洗、全部分析等耗时操作放到有界线程池里执行，请求立即返回任务 ID。
+
+- 相同 key 的任务还在排队时，再次提交直接返回排队中的那个任务（合并重复点击）。
+- 任务声明要用到的资源（如 'raw'、'clean'、'figures'），同一资源同一时间只有一个任务在用，
+  避免两个爬取同时写 招生数据.csv。
+- 任务的 print 输出通过 output_capture 按线程捕获到任务自己的日志，不替换全局 sys.stdout；
+  日志同时写入任务日志文件和 last_action.log（首页的实时日志）。
+"""
+import os
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from output_capture import capture
+
+STATUS_QUEUED = 'queued'
+STATUS_RUNNING = 'running'
+STATUS_SUCCEEDED = 'succeeded'
+STATUS_FAILED = 'failed'
+
+
+class JobLog:
+    """任务日志：保存在内存中，同时写入若干日志文件。可直接作为 print 的输出目标。
+
+    paths 中的文件会被清空重写；append_paths 以追加方式打开（几个任务同时写也不会互相覆盖）。
+    on_write 在每次写入文件后调用（如唤醒实时日志的订阅者）。
+    """
+
+    def __init__(self, paths=(), append_paths=(), on_write=None):
+        self._lock = threading.Lock()
+        self._on_write = on_write
+        self._parts = []
+        self._files = []
+        for path, mode in [(p, 'w') for p in paths] + [(p, 'a') for p in append_paths]:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            self._files.append(open(path, mode, encoding='utf-8'))
+
+    def write(self, s):
+        if not s:
+            return 0
+        with self._lock:
+            self._parts.append(s)
+            for f in self._files:
+                f.write(s)
+                f.flush()  # 每次都刷新，实时日志能立刻读到
+        if self._on_write is not None:
+            self._on_write()
+        return len(s)
+
+    def flush(self):
+        pass
+
+    def text(self):
+        with self._lock:
+            return ''.join(self._parts)
+
+    def close(self):
+        with self._lock:
+            for f in self._files:
+                f.close()
+            self._files = []
+
+
+class Job:
+    def __init__(self, kind, func, key, resources):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.key = key
+        self.resources = tuple(sorted(set(resources)))
+        self.func = func
+        self.status = STATUS_QUEUED
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.log = None
+        self.done = threading.Event()
+
+    def to_dict(self, with_log=False):
+        d = {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'result': self.result,
+            'error': self.error,
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished,
+        }
+        if with_log:
+            d['log'] = self.log.text() if self.log is not None else ''
+        return d
+
+
+class JobManager:
+    """有界线程池 + 任务表。
+
+    submit(kind, func, key=None, resources=()) 返回 (job, created)；func(log) 在后台线程中运行，
+    log 是该任务的 JobLog，返回值作为任务结果（一般是给用户看的一句话）。
+    on_write 在 mirror_path 被清空或写入后调用。
+    """
+
+    def __init__(self, log_dir, mirror_path=None, max_workers=2, history=100, on_write=None):
+        self.log_dir = log_dir
+        self.mirror_path = mirror_path
+        self.on_write = on_write
+        self.history = history
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()      # id -> Job，按提交顺序
+        self._pending = {}              # key -> 排队中的 Job
+        self._resources = {}            # 资源名 -> Lock
+
+    def submit(self, kind, func, key=None, resources=()):
+        key = key or kind
+        with self._lock:
+            job = self._pending.get(key)
+            if job is not None:
+                return job, False
+            job = Job(kind, func, key, resources)
+            self._jobs[job.id] = job
+            self._pending[key] = job
+            for r in job.resources:
+                self._resources.setdefault(r, threading.Lock())
+            self._trim()
+        self._pool.submit(self._run, job)
+        return job, True
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self):
+        """最近的任务，新提交的在前。"""
+        with self._lock:
+            return list(reversed(self._jobs.values()))
+
+    def _trim(self):
+        finished = [j for j in self._jobs.values() if j.done.is_set()]
+        for job in finished[:max(0, len(self._jobs) - self.history)]:
+            del self._jobs[job.id]
+            try:
+                os.remove(os.path.join(self.log_dir, f'{job.id}.log'))
+            except OSError:
+                pass
+
+    def _run(self, job):
+        locks = [self._resources[r] for r in job.resources]  # 按名称排序加锁，避免死锁
+        for lock in locks:
+            lock.acquire()
+        try:
+            with self._lock:
+                if self._pending.get(job.key) is job:
+                    del self._pending[job.key]  # 开始执行后，新的提交会重新排队
+            job.status = STATUS_RUNNING
+            job.started = time.time()
+            mirror = []
+            if self.mirror_path:
+                # 最新开始的任务清空 last_action.log；仍在运行的任务继续追加，不会覆盖
+                with open(self.mirror_path, 'w', encoding='utf-8'):
+                    pass
+                if self.on_write is not None:
+                    self.on_write()
+                mirror.append(self.mirror_path)
+            job.log = JobLog([os.path.join(self.log_dir, f'{job.id}.log')], mirror, self.on_write)
+            try:
+                with capture(job.log, job.log):
+                    job.result = job.func(job.log)
+                job.status = STATUS_SUCCEEDED
+            except Exception as e:
+                job.log.write(f'\n=== {job.kind.upper()} EXCEPTION ===\n')
+                job.log.write(traceback.format_exc())
+                job.error = str(e)
+                job.status = STATUS_FAILED
+            finally:
+                job.log.close()
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+            job.finished = time.time()
+            if job.started is not None:
+                metrics.observe('job_wait_seconds', job.started - job.created, help='任务排队等待的时间', kind=job.kind)
+                metrics.observe('job_run_seconds', job.finished - job.started, help='任务执行时间',
+                                kind=job.kind, status=job.status)
+            job.done.set()
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait)
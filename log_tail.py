@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""日志文件的增量跟踪：多个 SSE 客户端共享一个 LogTailer，只推送新追加的内容。
+
+- LogTailer 记住已读到的字节偏移，文件变化时只读取新增部分，读一次分发给所有订阅者；
+  内存中只保留最后 max_buffer 字节，新连接的客户端先收到这段内容。
+- 写日志的一方调用 notify() 立即唤醒等待中的订阅者；其他进程直接写文件时，
+  每个 LogTailer（不是每个订阅者）每 poll 秒检查一次文件作为兜底，poll=None 时不检查。
+- 文件被清空或重写时（新任务开始）epoch 改变，订阅者收到 reset 重新显示。
+- 位置用 "<epoch>-<偏移>" 表示，可作为 SSE 的 id；断线重连时带回 Last-Event-ID 即可接着读。
+
+用法:
+    tailer = LogTailer('last_action.log')
+    pos, text = tailer.snapshot()
+    for pos, reset, text in tailer.follow(pos):
+        ...
+"""
+import itertools
+import os
+import threading
+import time
+
+_epochs = itertools.count(int(time.time() * 1000))
+
+
+def _complete_utf8(data):
+    """去掉末尾不完整的 UTF-8 字符（写入方可能刚写了半个汉字）。"""
+    for i in range(1, min(4, len(data)) + 1):
+        b = data[-i]
+        if b < 0x80:
+            return data  # ASCII，完整
+        if b >= 0xC0:
+            need = 2 if b < 0xE0 else 3 if b < 0xF0 else 4
+            return data if i >= need else data[:-i]
+    return data
+
+
+def _skip_continuation(data):
+    """从文件中间开始读时，跳过开头残缺字符的后续字节。"""
+    i = 0
+    while i < len(data) and i < 3 and 0x80 <= data[i] < 0xC0:
+        i += 1
+    return data[i:]
+
+
+class LogTailer:
+    def __init__(self, path, poll=30.0, max_buffer=1 << 20):
+        self.path = path
+        self.poll = poll
+        self.max_buffer = max_buffer
+        self._cond = threading.Condition()
+        self._epoch = next(_epochs)
+        self._data = b''   # 文件 [_base, _end) 的内容
+        self._base = 0
+        self._end = 0
+        self._dirty = True
+        self._checked = float('-inf')  # 上次读取文件的时间（time.monotonic）
+
+    def notify(self):
+        """日志有写入（或被清空）时调用，唤醒所有订阅者。"""
+        with self._cond:
+            self._dirty = True
+            self._cond.notify_all()
+
+    def _reset(self):
+        self._epoch = next(_epochs)
+        self._data = b''
+        self._base = self._end = 0
+
+    def _refresh(self):
+        """读取文件新增的部分（调用时持有 _cond）。"""
+        self._dirty = False
+        self._checked = time.monotonic()
+        try:
+            with open(self.path, 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                if size < self._end:
+                    self._reset()  # 文件被截断
+                elif self._end and size >= self._end:
+                    # 文件被重写但长度没有变短：比较已读部分的末尾
+                    k = min(64, len(self._data))
+                    f.seek(self._end - k)
+                    if f.read(k) != self._data[len(self._data) - k:]:
+                        self._reset()
+                if size == self._end:
+                    return
+                start = self._end
+                if start == 0 and size > self.max_buffer:
+                    start = size - self.max_buffer
+                f.seek(start)
+                new = f.read(size - start)
+        except OSError:
+            if self._end:
+                self._reset()
+            return
+        if start != self._end:
+            new = _skip_continuation(new)
+            self._base = self._end = size - len(new)
+        new = _complete_utf8(new)
+        self._data += new
+        self._end += len(new)
+        if len(self._data) > self.max_buffer:
+            cut = _skip_continuation(self._data[-self.max_buffer:])
+            self._base += len(self._data) - len(cut)
+            self._data = cut
+
+    def _pos(self):
+        return f'{self._epoch}-{self._end}'
+
+    def snapshot(self):
+        """返回 (位置, 当前内容)，内容最多为最后 max_buffer 字节。"""
+        with self._cond:
+            if self._dirty or not self._end:
+                self._refresh()
+            return self._pos(), self._data.decode('utf-8', 'replace')
+
+    def _parse(self, pos):
+        try:
+            epoch, offset = (int(x) for x in str(pos).split('-'))
+        except (TypeError, ValueError):
+            return None
+        if epoch != self._epoch or not self._base <= offset <= self._end:
+            return None
+        return offset
+
+    def follow(self, pos=None, timeout=None):
+        """从 pos 之后开始逐段产出 (新位置, 是否重置, 文本)。
+
+        pos 无效（为空、已过期或来自之前的文件内容）时先产出一次 reset 和当前全部内容。
+        timeout 秒内没有新内容时产出 (位置, False, '')，方便调用方发送心跳。
+        """
+        with self._cond:
+            if self._dirty:
+                self._refresh()
+            offset = self._parse(pos)
+            epoch = self._epoch
+        if offset is None:
+            pos, text = self.snapshot()
+            offset = self._parse(pos)
+            epoch = self._epoch
+            yield pos, True, text
+        poll = self.poll if self.poll is not None else float('inf')
+        idle_since = time.monotonic()
+        while True:
+            with self._cond:
+                if not self._dirty and self._end == offset and self._epoch == epoch:
+                    now = time.monotonic()
+                    wait = self._checked + poll - now
+                    if timeout is not None:
+                        wait = min(wait, idle_since + timeout - now)
+                    if wait > 0:
+                        self._cond.wait(None if wait == float('inf') else wait)
+                    if not self._dirty and time.monotonic() - self._checked >= poll:
+                        self._dirty = True  # 兜底检查：同一时刻只有第一个醒来的订阅者真正读文件
+                if self._dirty:
+                    self._refresh()
+                if self._epoch != epoch or offset < self._base:
+                    epoch, offset, reset = self._epoch, self._base, True
+                else:
+                    reset = False
+                chunk = self._data[offset - self._base:]
+                offset = self._end
+                pos = self._pos()
+            now = time.monotonic()
+            if chunk or reset:
+                idle_since = now
+                yield pos, reset, chunk.decode('utf-8', 'replace')
+            elif timeout is not None and now - idle_since >= timeout:
+                idle_since = now
+                yield pos, False, ''
@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+"""轻量的运行指标：计数器、直方图（耗时）和取最大值的仪表（如峰值内存）。
+
+环境变量 APP_METRICS=1 时启用；未启用时 inc/observe/set_max 直接返回，timed() 返回共享的空上下文，
+几乎没有开销。
+
+- 进程内的指标由 render_prometheus() 输出为 Prometheus 文本格式（app.py 的 /metrics）。
+- 爬取、清洗等作为子进程运行的脚本在退出时调用 dump_at_exit(name)，把指标快照写到
+  METRICS_DIR/<name>.json；/metrics 读取这些快照一并输出，标签 source=<name>。
+- report(base) 生成一次运行的耗时报告（与 base 快照相减），打印到日志中。
+
+用法:
+    with metrics.timed('analysis_plot_seconds', plot='plot_hist_avg'):
+        ...
+    metrics.inc('crawl_requests_total', status='200')
+"""
+import atexit
+import copy
+import json
+import os
+import sys
+import threading
+import time
+
+ENABLED = os.environ.get('APP_METRICS', '') not in ('', '0')
+METRICS_DIR = os.environ.get('APP_METRICS_DIR') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'metrics')
+
+# 耗时直方图的默认桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_lock = threading.Lock()
+# 名称 -> {'kind', 'help', 'buckets', 'samples': {标签元组: 值}}
+# 计数器/仪表的值是数字；直方图的值是 [各桶计数..., 总和, 次数, 最大值]
+_families = {}
+
+
+def _sample(name, kind, help, buckets, labels):
+    fam = _families.get(name)
+    if fam is None:
+        fam = _families[name] = {'kind': kind, 'help': help, 'buckets': list(buckets or ()), 'samples': {}}
+    elif help and not fam['help']:
+        fam['help'] = help
+    return fam, tuple(sorted(labels.items()))
+
+
+def inc(name, value=1, help='', **labels):
+    """计数器加 value。"""
+    if not ENABLED:
+        return
+    with _lock:
+        fam, key = _sample(name, 'counter', help, None, labels)
+        fam['samples'][key] = fam['samples'].get(key, 0) + value
+
+
+def set_max(name, value, help='', **labels):
+    """仪表：记录出现过的最大值（如峰值内存）。"""
+    if not ENABLED or value is None:
+        return
+    with _lock:
+        fam, key = _sample(name, 'gauge', help, None, labels)
+        if value > fam['samples'].get(key, float('-inf')):
+            fam['samples'][key] = value
+
+
+def observe(name, value, help='', buckets=DEFAULT_BUCKETS, **labels):
+    """直方图记录一个观测值。"""
+    if not ENABLED:
+        return
+    with _lock:
+        fam, key = _sample(name, 'histogram', help, buckets, labels)
+        h = fam['samples'].get(key)
+        if h is None:
+            h = fam['samples'][key] = [0] * len(fam['buckets']) + [0.0, 0, float('-inf')]
+        for i, le in enumerate(fam['buckets']):
+            if value <= le:
+                h[i] += 1
+        h[-3] += value
+        h[-2] += 1
+        h[-1] = max(h[-1], value)
+
+
+class _Timer:
+    __slots__ = ('name', 'help', 'labels', 'start')
+
+    def __init__(self, name, help, labels):
+        self.name = name
+        self.help = help
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.name, time.perf_counter() - self.start, self.help, **self.labels)
+        return False
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def timed(name, help='', **labels):
+    """上下文管理器：把代码块的耗时（秒）记入直方图 name。"""
+    if not ENABLED:
+        return _NULL_TIMER
+    return _Timer(name, help, labels)
+
+
+def peak_rss_bytes():
+    """本进程的峰值常驻内存（字节），无法获取时返回 None。"""
+    try:
+        import resource
+    except ImportError:
+        return _peak_rss_windows()
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024  # Linux 上单位是 KB
+
+
+def _peak_rss_windows():
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD)] + [
+                (f, ctypes.c_size_t) for f in (
+                    'PeakWorkingSetSize', 'WorkingSetSize', 'QuotaPeakPagedPoolUsage', 'QuotaPagedPoolUsage',
+                    'QuotaPeakNonPagedPoolUsage', 'QuotaNonPagedPoolUsage', 'PagefileUsage', 'PeakPagefileUsage')]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        handle = ctypes.windll.kernel32.GetCurrentProcess()
+        if not ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+            return None
+        return counters.PeakWorkingSetSize
+    except (AttributeError, OSError):
+        return None
+
+
+def snapshot():
+    """当前全部指标的副本（可 JSON 序列化）。"""
+    with _lock:
+        return {name: {'kind': fam['kind'], 'help': fam['help'], 'buckets': list(fam['buckets']),
+                       'samples': [[dict(key), copy.copy(value)] for key, value in fam['samples'].items()]}
+                for name, fam in _families.items()}
+
+
+def merge(snap):
+    """把另一个进程的快照合并进来（计数器和直方图相加，仪表取最大值），用于进程池中的工作进程。"""
+    if not ENABLED or not snap:
+        return
+    with _lock:
+        for name, fam in snap.items():
+            for labels, value in fam['samples']:
+                mine, key = _sample(name, fam['kind'], fam['help'], fam['buckets'], labels)
+                old = mine['samples'].get(key)
+                if old is None:
+                    mine['samples'][key] = copy.copy(value)
+                elif fam['kind'] == 'gauge':
+                    mine['samples'][key] = max(old, value)
+                elif fam['kind'] == 'histogram':
+                    mine['samples'][key] = [a + b for a, b in zip(old[:-1], value[:-1])] + [max(old[-1], value[-1])]
+                else:
+                    mine['samples'][key] = old + value
+
+
+def reset():
+    with _lock:
+        _families.clear()
+
+
+def dump(path):
+    """把快照写为 JSON（先写临时文件再替换，读取方不会读到一半）。"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(snapshot(), f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def dump_at_exit(name):
+    """进程退出时把指标写到 METRICS_DIR/<name>.json（未启用时什么也不做）。"""
+    if ENABLED:
+        atexit.register(dump, os.path.join(METRICS_DIR, f'{name}.json'))
+
+
+def load_snapshots(directory=METRICS_DIR):
+    """读取目录下的全部快照，返回 {名称: 快照}。"""
+    out = {}
+    try:
+        names = sorted(fn for fn in os.listdir(directory) if fn.endswith('.json'))
+    except OSError:
+        return out
+    for fn in names:
+        try:
+            with open(os.path.join(directory, fn), encoding='utf-8') as f:
+                out[fn[:-5]] = json.load(f)
+        except (OSError, ValueError):
+            pass
+    return out
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels, extra=()):
+    items = list(labels.items()) + list(extra)
+    if not items:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in items) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_prometheus(sources=None):
+    """Prometheus 文本格式。sources 为 {来源名: 快照}，其中的样本加上标签 source=<来源名>。"""
+    merged = {}
+    for source, snap in [(None, snapshot())] + sorted((sources or {}).items()):
+        for name, fam in snap.items():
+            entry = merged.setdefault(name, {'kind': fam['kind'], 'help': fam['help'], 'buckets': fam['buckets'], 'rows': []})
+            if entry['kind'] != fam['kind'] or entry['buckets'] != fam['buckets']:
+                continue  # 同名但类型不同，忽略
+            extra = () if source is None else (('source', source),)
+            entry['rows'].extend((labels, extra, value) for labels, value in fam['samples'])
+    lines = []
+    for name in sorted(merged):
+        entry = merged[name]
+        if entry['help']:
+            lines.append(f'# HELP {name} {entry["help"]}')
+        lines.append(f'# TYPE {name} {entry["kind"]}')
+        for labels, extra, value in entry['rows']:
+            if entry['kind'] != 'histogram':
+                lines.append(f'{name}{_labels(labels, extra)} {_number(value)}')
+                continue
+            for le, count in zip(entry['buckets'], value):
+                lines.append(f'{name}_bucket{_labels(labels, tuple(extra) + (("le", _number(float(le))),))} {count}')
+            lines.append(f'{name}_bucket{_labels(labels, tuple(extra) + (("le", "+Inf"),))} {value[-2]}')
+            lines.append(f'{name}_sum{_labels(labels, extra)} {_number(value[-3])}')
+            lines.append(f'{name}_count{_labels(labels, extra)} {value[-2]}')
+    return '\n'.join(lines) + '\n'
+
+
+def report(base=None):
+    """本次运行的指标报告（纯文本）：耗时直方图列出次数/总计/平均/最大，计数器和仪表列出数值。
+
+    base 为运行开始时的 snapshot()，给出时计数器和直方图只统计之后的增量。
+    """
+    if not ENABLED:
+        return ''
+    before = {}
+    for name, fam in (base or {}).items():
+        for labels, value in fam['samples']:
+            before[(name, tuple(sorted(labels.items())))] = value
+    timings, values = [], []
+    for name, fam in sorted(snapshot().items()):
+        for labels, value in fam['samples']:
+            label = name + _labels(labels)
+            old = before.get((name, tuple(sorted(labels.items()))))
+            if fam['kind'] == 'histogram':
+                count = value[-2] - (old[-2] if old else 0)
+                total = value[-3] - (old[-3] if old else 0)
+                if count:
+                    timings.append((total, label, count, value[-1]))
+            elif fam['kind'] == 'counter':
+                delta = value - (old or 0)
+                if delta:
+                    values.append(f'  {label:<60} {delta:g}')
+            else:
+                values.append(f'  {label:<60} {value:g}')
+    lines = ['=== METRICS ===']
+    if timings:
+        lines.append(f'  {"耗时":<58} {"次数":>6} {"总计(s)":>10} {"平均(ms)":>10} {"最大(ms)":>10}')
+        for total, label, count, peak in sorted(timings, reverse=True):
+            lines.append(f'  {label:<60} {count:>6} {total:>10.3f} {total / count * 1000:>10.1f} {peak * 1000:>10.1f}')
+    lines.extend(values)
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""按线程捕获 print 输出，不替换进程全局的 sys.stdout。
+
+contextlib.redirect_stdout 会把 sys.stdout 换成另一个对象，期间其他线程的输出也会被
+写进去，结束时再换回来——多个请求/任务并发时输出会互相串。这里在第一次使用时把
+sys.stdout / sys.stderr 各替换为一个代理（只替换一次），代理按当前线程查找输出目标，
+没有设置目标的线程照常写到原来的流。
+
+用法:
+    buf = io.StringIO()
+    with capture(buf):
+        print('只进入 buf')
+"""
+import contextlib
+import sys
+import threading
+
+_local = threading.local()
+_install_lock = threading.Lock()
+
+
+class _ThreadOutput:
+    """sys.stdout / sys.stderr 的代理：写入当前线程设置的目标，没有设置时写入原始流。"""
+
+    def __init__(self, name, original):
+        self._name = name
+        self._original = original
+
+    def _target(self):
+        return getattr(_local, self._name, None) or self._original
+
+    def write(self, s):
+        return self._target().write(s)
+
+    def flush(self):
+        target = self._target()
+        if hasattr(target, 'flush'):
+            target.flush()
+
+    def __getattr__(self, attr):
+        # encoding、isatty、fileno 等属性转发给当前目标
+        return getattr(self._target(), attr)
+
+
+def install():
+    """把 sys.stdout / sys.stderr 替换为按线程分发的代理（重复调用无效果）。"""
+    with _install_lock:
+        for name in ('stdout', 'stderr'):
+            if not isinstance(getattr(sys, name), _ThreadOutput):
+                setattr(sys, name, _ThreadOutput(name, getattr(sys, name)))
+
+
+@contextlib.contextmanager
+def capture(stdout, stderr=None):
+    """当前线程内的 print 输出写入 stdout（stderr 不为 None 时错误输出写入 stderr），可以嵌套。"""
+    install()
+    prev = getattr(_local, 'stdout', None), getattr(_local, 'stderr', None)
+    _local.stdout = stdout
+    if stderr is not None:
+        _local.stderr = stderr
+    try:
+        yield stdout
+    finally:
+        _local.stdout, _local.stderr = prev
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""按考生分数/位次估计各 (学校, 专业) 的录取可能性并排序推荐。
+
+模型：每个 (学校, 专业, 科类) 多年的 最低位次 取对数后近似正态分布 N(mu, sigma)，
+考生位次 r 被录取的概率为 P(明年最低位次 >= r) = Phi((mu - ln r) / sigma)。
+年份少时 sigma 向 PRIOR_SIGMA 收缩，避免只有一两年数据时概率过于极端。
+
+所有 (学校, 专业) 的 mu/sigma 预先放在数组里，一次查询（或一批考生）对全部专业做一次向量化计算。
+
+用法:
+    rec = Recommender(df)
+    rec.recommend(score=620, kelei='理科')           # 单个考生，返回 DataFrame
+    rec.chances([3000, 8000, 15000])                # 一批考生 x 全部专业的概率矩阵
+"""
+import numpy as np
+import pandas as pd
+
+from score_rank import ScoreRankIndex
+
+PRIOR_SIGMA = 0.25   # 对数位次的先验标准差（约 ±25% 的年度波动）
+PRIOR_WEIGHT = 2.0   # 先验相当于多少年的数据
+MIN_SIGMA = 0.05
+
+# 按录取概率划分：冲（把握较小）、稳、保（把握较大）
+CHANCE_LEVELS = [(0.8, '保'), (0.4, '稳'), (0.0, '冲')]
+
+
+def _norm_cdf(z):
+    """标准正态分布函数，erf 用 Abramowitz-Stegun 7.1.26 近似（误差 < 1.5e-7），不依赖 scipy。"""
+    x = np.abs(z) / np.sqrt(2.0)
+    t = 1.0 / (1.0 + 0.3275911 * x)
+    poly = t * (0.254829592 + t * (-0.284496736 + t * (1.421413741 + t * (-1.453152027 + t * 1.061405429))))
+    erf = 1.0 - poly * np.exp(-x * x)
+    return 0.5 * (1.0 + np.sign(z) * erf)
+
+
+def _norm_ppf(p):
+    """标准正态分布的分位数（对 _norm_cdf 二分求解，只用于少量标量）。"""
+    lo, hi = -10.0, 10.0
+    for _ in range(60):
+        mid = (lo + hi) / 2
+        if _norm_cdf(mid) < p:
+            lo = mid
+        else:
+            hi = mid
+    return (lo + hi) / 2
+
+
+def build_history(df):
+    """每个 (学校, 专业, 科类) 一行的历史表：年份数、最近一年及其最低位次、对数位次的 mu/sigma。"""
+    data = df[['学校', '专业', '科类', '招生年份', '最低位次']].dropna()
+    data = data[data['最低位次'] > 0]
+    keys = ['学校', '专业', '科类']
+    # 同一年同一专业有多条记录（如不同批次）时取最低位次的中位数
+    yearly = data.groupby(keys + ['招生年份'], observed=True)['最低位次'].median().reset_index()
+    yearly['log_rank'] = np.log(yearly['最低位次'].to_numpy(dtype='float64'))
+    yearly = yearly.sort_values(keys + ['招生年份'])
+    grp = yearly.groupby(keys, observed=True, sort=True)
+    hist = grp['log_rank'].agg(['mean', 'var', 'size'])
+    last = grp[['招生年份', '最低位次']].last()
+    n = hist['size'].to_numpy(dtype='float64')
+    var = np.nan_to_num(hist['var'].to_numpy(dtype='float64'))
+    sigma = np.sqrt((var * (n - 1) + PRIOR_SIGMA ** 2 * PRIOR_WEIGHT) / (n - 1 + PRIOR_WEIGHT))
+    out = pd.DataFrame({
+        'years': hist['size'].to_numpy(),
+        'last_year': last['招生年份'].to_numpy(),
+        'last_rank': last['最低位次'].to_numpy(),
+        'mu': hist['mean'].to_numpy(),
+        'sigma': np.maximum(sigma, MIN_SIGMA),
+    }, index=hist.index).reset_index()
+    for c in keys:
+        out[c] = out[c].astype(object)
+    return out
+
+
+class Recommender:
+    """对全部 (学校, 专业, 科类) 的向量化录取概率估计。
+
+    - `history`: build_history 的结果，行顺序即 chances() 返回矩阵的列顺序。
+    - `rank_index`: 用于把分数换算为位次的 ScoreRankIndex。
+    """
+
+    def __init__(self, df, rank_index=None):
+        self.history = build_history(df)
+        self.rank_index = rank_index if rank_index is not None else ScoreRankIndex(df)
+        self._mu = self.history['mu'].to_numpy(dtype='float64')
+        self._sigma = self.history['sigma'].to_numpy(dtype='float64')
+        self._kelei = self.history['科类'].to_numpy(dtype=object)
+        self._by_kelei = {}
+
+    def score_to_rank(self, score, kelei, year=None):
+        """分数换算为位次，year 为 None 时用该科类最近一年的对照表。"""
+        if year is None:
+            years = [y for y, k in self.rank_index.keys() if k == kelei]
+            if not years:
+                raise KeyError(f'没有 {kelei} 的分数/位次数据')
+            year = max(years)
+        return self.rank_index.score_to_rank(year, kelei, score)
+
+    def chances(self, ranks, kelei=None):
+        """一批考生位次 x 全部专业的录取概率矩阵，形状 (考生数, 专业数)；kelei 不符的专业为 0。"""
+        log_r = np.log(np.atleast_1d(np.asarray(ranks, dtype='float64')))[:, None]
+        prob = _norm_cdf((self._mu[None, :] - log_r) / self._sigma[None, :])
+        if kelei is not None:
+            prob = np.where(self._kelei[None, :] == kelei, prob, 0.0)
+        return np.nan_to_num(prob)
+
+    def _candidates(self, kelei):
+        """某科类（None 为全部）的专业下标，按 mu 升序（历史位次从高到低）排列，结果缓存。"""
+        hit = self._by_kelei.get(kelei)
+        if hit is None:
+            cols = np.arange(len(self._mu)) if kelei is None else np.flatnonzero(self._kelei == kelei)
+            cols = cols[np.argsort(self._mu[cols], kind='stable')]
+            hit = self._by_kelei[kelei] = (cols, self._mu[cols], self._sigma[cols])
+        return hit
+
+    def top_options(self, ranks, kelei=None, top_k=30, min_prob=0.1, block=64):
+        """每个考生概率不低于 min_prob 的专业中，最难考（历史位次最靠前）的 top_k 个。
+
+        返回 (indices, probs)，形状均为 (考生数, top_k)，按难度排列；不足 top_k 个时 indices 为 -1。
+        概率 >= min_prob 等价于 mu - z * sigma >= ln r（z 为 min_prob 对应的正态分位数），
+        因此筛选只需比较，正态分布函数只对选中的专业计算。考生按 block 个一组处理以限制内存。
+        """
+        log_r = np.log(np.atleast_1d(np.asarray(ranks, dtype='float64')))
+        cols, mu, sigma = self._candidates(kelei)
+        threshold = mu - _norm_ppf(min(max(min_prob, 1e-9), 1 - 1e-9)) * sigma
+        idx = np.full((len(log_r), top_k), -1, dtype='int64')
+        probs = np.zeros((len(log_r), top_k))
+        for start in range(0, len(log_r), block):
+            lr = log_r[start:start + block, None]
+            feasible = threshold[None, :] >= lr
+            pos = np.cumsum(feasible, axis=1, dtype='int32')
+            rows, sel = np.nonzero(feasible & (pos <= top_k))
+            slot = pos[rows, sel] - 1
+            idx[start + rows, slot] = cols[sel]
+            probs[start + rows, slot] = _norm_cdf((mu[sel] - lr[rows, 0]) / sigma[sel])
+        return idx, probs
+
+    def recommend(self, rank=None, score=None, kelei=None, year=None, top_k=30, min_prob=0.1):
+        """单个考生的推荐列表（DataFrame），按历史位次从高到低排列，附录取概率和 冲/稳/保 分类。"""
+        if top_k < 0:
+            raise ValueError('top_k 不能为负数')
+        if rank is None:
+            if score is None or kelei is None:
+                raise ValueError('需要提供 rank，或同时提供 score 和 kelei')
+            rank = self.score_to_rank(score, kelei, year)
+            if np.isnan(rank):
+                raise ValueError(f'分数 {score} 超出 {kelei} 已有的分数范围，请直接提供位次')
+        elif not rank > 0:  # 也排除 nan
+            raise ValueError('rank 必须是正数')
+        idx, probs = self.top_options([rank], kelei, top_k, min_prob)
+        keep = idx[0] >= 0
+        rows = self.history.iloc[idx[0][keep]][['学校', '专业', '科类', 'years', 'last_year', 'last_rank']].copy()
+        rows['chance'] = probs[0][keep]
+        rows['level'] = [next(name for lo, name in CHANCE_LEVELS if p >= lo) for p in rows['chance']]
+        rows.attrs['rank'] = float(rank)
+        return rows.reset_index(drop=True)
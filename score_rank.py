@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""分数与位次互查：按 (招生年份, 科类) 建立 最低分 -> 最低位次 的有序对照表。
+
+每个 (年份, 科类) 保存两条按分数升序排列的数组，查询时用 np.interp 二分查找并线性插值，
+一次可以传入一批分数（或位次），不再扫描整张表。
+
+用法:
+    index = ScoreRankIndex(df)
+    index.score_to_rank(2023, '理科', [600, 620.5])
+    index.rank_to_score(2023, '理科', 5000)
+"""
+import numpy as np
+import pandas as pd
+
+
+def _isotonic_decreasing(x, y, w):
+    """加权保序回归（PAV）：返回 x 升序时单调不增的 y 拟合值，每个合并块只保留一个点。
+
+    同一分数线不同专业的位次有出入，偶尔还有明显异常；这里把违反“分数越高位次越小”
+    的相邻点合并成块，块的分数和位次取加权平均。
+    """
+    blocks = []  # [x 的加权和, y 的加权和, 权重]
+    for xi, yi, wi in zip(x, y, w):
+        blocks.append([xi * wi, yi * wi, wi])
+        while len(blocks) > 1 and blocks[-2][1] / blocks[-2][2] <= blocks[-1][1] / blocks[-1][2]:
+            sx, sy, sw = blocks.pop()
+            blocks[-1][0] += sx
+            blocks[-1][1] += sy
+            blocks[-1][2] += sw
+    sw = np.array([b[2] for b in blocks], dtype='float64')
+    xs = np.array([b[0] for b in blocks], dtype='float64') / sw
+    ys = np.array([b[1] for b in blocks], dtype='float64') / sw
+    return xs, ys
+
+
+class ScoreRankIndex:
+    """分数/位次对照索引。
+
+    - 每个 (招生年份, 科类) 一对数组：`scores` 严格升序，`ranks` 严格降序（分数越高位次越靠前）。
+      同一分数的多条记录取位次中位数，再用保序回归去掉不单调的点。
+    - 查询对批量输入向量化，每个值 O(log n)；超出该年份已有分数（位次）范围时返回 NaN。
+    """
+
+    def __init__(self, df, score_col='最低分', rank_col='最低位次'):
+        self.tables = {}
+        cols = ['招生年份', '科类', score_col, rank_col]
+        data = df[cols].dropna()
+        for (year, kelei), grp in data.groupby(['招生年份', '科类'], observed=True):
+            per_score = grp.groupby(score_col)[rank_col].agg(['median', 'size'])
+            scores, ranks = _isotonic_decreasing(
+                per_score.index.to_numpy(dtype='float64'),
+                per_score['median'].to_numpy(dtype='float64'),
+                per_score['size'].to_numpy(dtype='float64'))
+            self.tables[(int(year), str(kelei))] = (scores, ranks)
+
+    def keys(self):
+        """所有 (年份, 科类)，已排序。"""
+        return sorted(self.tables)
+
+    def _table(self, year, kelei):
+        try:
+            return self.tables[(int(year), str(kelei))]
+        except KeyError:
+            raise KeyError(f'没有 {year} 年 {kelei} 的分数/位次数据') from None
+
+    def score_to_rank(self, year, kelei, scores):
+        """分数 -> 估计位次。scores 可以是单个数或数组，返回同样形状的 float（或 ndarray）。"""
+        xs, ys = self._table(year, kelei)
+        q = np.asarray(scores, dtype='float64')
+        out = np.interp(q, xs, ys, left=np.nan, right=np.nan)
+        return float(out) if out.ndim == 0 else out
+
+    def rank_to_score(self, year, kelei, ranks):
+        """位次 -> 估计分数。ranks 可以是单个数或数组。"""
+        xs, ys = self._table(year, kelei)
+        q = np.asarray(ranks, dtype='float64')
+        out = np.interp(q, ys[::-1], xs[::-1], left=np.nan, right=np.nan)
+        return float(out) if out.ndim == 0 else out
+
+    def to_frame(self):
+        """展开为 DataFrame（招生年份, 科类, 分数, 位次），方便查看或导出。"""
+        parts = [pd.DataFrame({'招生年份': year, '科类': kelei, '分数': xs, '位次': ys})
+                 for (year, kelei), (xs, ys) in sorted(self.tables.items())]
+        return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=['招生年份', '科类', '分数', '位次'])